@@ -0,0 +1,99 @@
+import numpy as np
+
+# node states (compartments), stored as uint8, COMPARTMENTS[state] is the name
+SUSCEPTIBLE = 0
+INFECTED = 1
+EXPOSED = 2
+RECOVERED = 3
+DEAD = 4
+COMPARTMENTS = ("S", "I", "E", "R", "D")
+
+
+class DwellTime:
+    """
+    Distribution of the whole number of hours a node stays in a compartment (at least 1).
+
+    kind is "fixed" (always mean), "geometric" (memoryless, leaves every hour with probability 1/mean),
+    "gamma" or "lognormal" (both given by mean and sd, in hours).
+    """
+
+    KINDS = ("fixed", "geometric", "gamma", "lognormal")
+
+    def __init__(self, kind, mean, sd=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown dwell time distribution {kind!r}, expected one of {self.KINDS}")
+        if mean < 1:
+            raise ValueError("mean dwell time must be at least 1 hour")
+        if kind in ("gamma", "lognormal") and not sd:
+            raise ValueError(f"a {kind} dwell time needs sd")
+        self.kind = kind
+        self.mean = mean
+        self.sd = sd
+
+    def sample(self, size, rng) -> np.ndarray:
+        """
+        returns size dwell times in hours as int32
+        """
+        if self.kind == "fixed":
+            hours = np.full(size, self.mean)
+        elif self.kind == "geometric":
+            hours = rng.geometric(1 / self.mean, size)
+        elif self.kind == "gamma":
+            shape = (self.mean / self.sd) ** 2
+            hours = rng.gamma(shape, self.mean / shape, size)
+        else:
+            sigma2 = np.log1p((self.sd / self.mean) ** 2)
+            hours = rng.lognormal(np.log(self.mean) - sigma2 / 2, np.sqrt(sigma2), size)
+        return np.maximum(np.rint(hours), 1).astype(np.int32)
+
+    def __repr__(self):
+        sd = f", sd={self.sd}" if self.sd is not None else ""
+        return f"DwellTime({self.kind!r}, mean={self.mean}{sd})"
+
+
+class CompartmentModel:
+    """
+    Which compartments a node goes through after infection and how long it stays in each.
+
+    S -> (E ->) I (-> R or D). exposed is the E dwell time (None: infected nodes are infectious at once),
+    infectious the I dwell time (None: nodes never leave I, the SI model of testing.py) and
+    fatality the probability that a node leaving I goes to D instead of R.
+    """
+
+    def __init__(self, exposed: DwellTime | None = None, infectious: DwellTime | None = None, fatality=0.0):
+        if fatality and infectious is None:
+            raise ValueError("fatality needs an infectious dwell time")
+        self.exposed = exposed
+        self.infectious = infectious
+        self.fatality = fatality
+
+    @classmethod
+    def si(cls) -> "CompartmentModel":
+        return cls()
+
+    @classmethod
+    def sir(cls, infectious: DwellTime, fatality=0.0) -> "CompartmentModel":
+        return cls(infectious=infectious, fatality=fatality)
+
+    @classmethod
+    def seir(cls, exposed: DwellTime, infectious: DwellTime, fatality=0.0) -> "CompartmentModel":
+        return cls(exposed=exposed, infectious=infectious, fatality=fatality)
+
+    @property
+    def compartments(self) -> tuple[str, ...]:
+        """
+        names of the compartments nodes can be in under this model
+        """
+        names = ["S"]
+        if self.exposed is not None:
+            names.append("E")
+        names.append("I")
+        if self.infectious is not None:
+            names.append("R")
+            if self.fatality:
+                names.append("D")
+        return tuple(names)
+
+    def __repr__(self):
+        return (f"CompartmentModel(exposed={self.exposed}, infectious={self.infectious}, "
+                f"fatality={self.fatality})")
@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from graph_arrays import CSRGraph, load_arrays, load_graph, save_arrays, save_graph
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation_revised"))
+from random_streams import seed_sequence_from
+
+from compartment_model import COMPARTMENTS
+from simulation import ETP, MAX_CONTACTS_PER_HOUR, BatchedSimulation, Simulation
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# hours a task simulates between two results it sends
+DEFAULT_WINDOW = 24
+# seconds the main process waits on the result queue before checking for dead workers
+QUEUE_POLL_SECONDS = 1.0
+
+# graph, ETP column and result queue of the worker process, set once by _init_worker
+_graph = None
+_etp = None
+_results = None
+
+
+def _init_worker(graph_path, etp_path, results=None):
+    global _graph, _etp, _results
+    _graph = load_graph(graph_path, mmap=True)
+    _etp = load_arrays(etp_path, "edge_etp", mmap=True)[0]["etp"]
+    _results = results
+
+
+def _iter_replicates(first_run_index, num_runs, run_seed, model, hours, initial_infected, max_contacts_per_hour,
+                     window):
+    """
+    Runs num_runs outbreaks on the worker's graph, one Simulation or one BatchedSimulation for all of them.
+    yields [(run_index, compartment counts of the hours stepped)] after every window hours (after the whole
+    run if window is None), the curves are the same whatever window is
+    """
+    rng = np.random.default_rng(run_seed)
+    if num_runs == 1:
+        simulation = Simulation(_graph, rng, max_contacts_per_hour, model, etp=_etp)
+        if initial_infected is None:
+            initial_infected = [int(rng.integers(_graph.num_nodes))]
+        simulation.infect(initial_infected)
+    else:
+        simulation = BatchedSimulation(_graph, num_runs, rng, max_contacts_per_hour, model, etp=_etp)
+        if initial_infected is None:
+            simulation.infect_replicates(rng.integers(_graph.num_nodes, size=num_runs))
+        else:
+            for node in initial_infected:
+                simulation.infect_replicates(np.full(num_runs, node))
+
+    stepped = 0
+    while True:
+        span = hours - stepped if hours is not None else None
+        if window is not None:
+            span = window if span is None else min(window, span)
+        counts = simulation.run(span).astype(np.int32)
+        if len(counts) or not stepped:
+            if num_runs == 1:
+                yield [(first_run_index, counts)]
+            else:
+                yield [(first_run_index + r, counts[:, r]) for r in range(num_runs)]
+        stepped += len(counts)
+        # run stops early once the outbreak is over
+        if span is None or len(counts) < span or span == 0:
+            return
+
+
+def _run_replicates(*task):
+    """
+    Runs a task in a worker process, the results of every window go to the result queue and a None follows
+    the last one (also when the task fails, its future then holds the error)
+    """
+    try:
+        for results in _iter_replicates(*task):
+            _results.put(results)
+    finally:
+        _results.put(None)
+
+
+def iter_ensemble(graph, num_runs, seed=None, model=None, hours=None, initial_infected=None,
+                  max_contacts_per_hour=MAX_CONTACTS_PER_HOUR, workers=None, batch_size=1, window=DEFAULT_WINDOW):
+    """
+    Runs num_runs outbreaks on the same graph, yields (run_index, counts) as the runs progress, counts being the
+    per-hour compartment counts of Simulation.run (columns in COMPARTMENTS order) of the hours stepped since the
+    run's previous result. Concatenated they make the run's curve.
+
+    - graph is the path of a graph saved with save_graph, or a CSRGraph (written to a temporary directory)
+    - every task gets its own stream spawned from seed (int, SeedSequence or Generator) and its runs start
+      from initial_infected, or from one node drawn from the stream, so results don't depend on workers
+    - workers processes (default: one per core) memory-map the graph arrays and the ETP column, which is
+      computed once, so they share the pages instead of each getting a copy of the graph
+    - batch_size > 1 makes every task a BatchedSimulation of that many runs, much cheaper for small outbreaks
+      (the results then depend on batch_size)
+    - every task sends its results after each window hours through a queue, so hours arrive while the runs go on
+      (window=None: once per run, when the run, or with batch_size > 1 its whole batch, is over)
+    """
+    workers = workers or os.cpu_count()
+    seed_sequence = seed_sequence_from(seed)
+    first_run_indices = range(0, num_runs, batch_size)
+    task_seeds = seed_sequence.spawn(len(first_run_indices))
+
+    shared_dir = tempfile.mkdtemp(prefix="ensemble-")
+    try:
+        if isinstance(graph, CSRGraph):
+            graph_path = os.path.join(shared_dir, "graph")
+            save_graph(graph_path, graph)
+        else:
+            graph_path = graph
+        shared_graph = load_graph(graph_path, mmap=True)
+        etp_path = os.path.join(shared_dir, "etp")
+        save_arrays(etp_path, "edge_etp", {"etp": ETP(shared_graph.tp, shared_graph.ci).astype(np.float32)})
+
+        tasks = [(first, min(batch_size, num_runs - first), task_seed, model, hours, initial_infected,
+                  max_contacts_per_hour, window) for first, task_seed in zip(first_run_indices, task_seeds)]
+        if workers == 1:
+            _init_worker(graph_path, etp_path)
+            for task in tasks:
+                for results in _iter_replicates(*task):
+                    yield from results
+            return
+
+        results_queue = multiprocessing.Queue()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(graph_path, etp_path, results_queue)) as executor:
+            futures = [executor.submit(_run_replicates, *task) for task in tasks]
+            tasks_done = 0
+            while tasks_done < len(tasks):
+                try:
+                    results = results_queue.get(timeout=QUEUE_POLL_SECONDS)
+                except queue.Empty:
+                    # a worker that died never sends its None, its future is then broken
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+                    continue
+                if results is None:
+                    tasks_done += 1
+                else:
+                    yield from results
+            for future in futures:
+                future.result()
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+def pad_curves(curves) -> np.ndarray:
+    """
+    Stacks per-run curves of different lengths into a (runs, hours) array, runs that ended early
+    keep their last value (nothing changes once an outbreak is over).
+    """
+    length = max((len(curve) for curve in curves), default=0)
+    padded = np.zeros((len(curves), length), dtype=np.int64)
+    for i, curve in enumerate(curves):
+        padded[i, :len(curve)] = curve
+        if 0 < len(curve) < length:
+            padded[i, len(curve):] = curve[-1]
+    return padded
+
+
+def prevalence_quantiles(curves, quantiles=DEFAULT_QUANTILES) -> np.ndarray:
+    """
+    returns the (len(quantiles), hours) quantiles over runs of every hour of the curves
+    """
+    return np.quantile(pad_curves(curves), quantiles, axis=0)
+
+
+def run_ensemble(graph, num_runs, seed=None, model=None, hours=None, initial_infected=None,
+                 max_contacts_per_hour=MAX_CONTACTS_PER_HOUR, workers=None, batch_size=1, compartment="I",
+                 quantiles=DEFAULT_QUANTILES, on_run=None, window=DEFAULT_WINDOW):
+    """
+    Runs an ensemble (see iter_ensemble) and aggregates the per-hour number of nodes in compartment.
+    on_run(run_index, curve) is called with the run's curve so far every time new hours of it arrive.
+    returns (curves, bands): the (num_runs, hours) curves in run order and their quantiles (see prevalence_quantiles)
+    """
+    column = COMPARTMENTS.index(compartment)
+    curves = [np.zeros(0, dtype=np.int32) for _ in range(num_runs)]
+    for run_index, counts in iter_ensemble(graph, num_runs, seed, model, hours, initial_infected,
+                                           max_contacts_per_hour, workers, batch_size, window):
+        curves[run_index] = np.concatenate([curves[run_index], counts[:, column]])
+        if on_run is not None:
+            on_run(run_index, curves[run_index])
+
+    return pad_curves(curves), prevalence_quantiles(curves, quantiles)
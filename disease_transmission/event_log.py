@@ -0,0 +1,148 @@
+import os
+import shutil
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from graph_arrays import load_arrays, write_manifest
+
+from compartment_model import COMPARTMENTS
+
+# edge type code of the events of nodes infected from outside (infect()), source is then -1
+SEED_EDGE_TYPE = 255
+
+# columns of the log: infection events and per-hour aggregates
+EVENT_COLUMNS = {"event_hour": np.int32, "event_source": np.int32, "event_target": np.int32,
+                 "event_etype": np.uint8}
+HOUR_COLUMNS = {"hour": np.int32, "hour_new_infections": np.int64, "hour_contacts": np.int64}
+# (hours, len(COMPARTMENTS)) compartment counts at the end of every logged hour
+COUNTS_COLUMN = "hour_counts"
+
+# events buffered in memory before a chunk is written
+DEFAULT_CHUNK_EVENTS = 1 << 20
+
+
+class EventLogWriter:
+    """
+    Streams the infection events of a simulation (hour, source, target, edge type) and per-hour aggregates
+    to an array directory (see graph_arrays.save_arrays).
+
+    Records are buffered and appended to one raw little-endian file per column every chunk_events events,
+    so memory stays bounded whatever the length of the run. The log is written next to path and renamed into
+    place by close(), which also writes the manifest, so a finished log loads memory-mapped with read_event_log.
+    """
+
+    def __init__(self, path, chunk_events=DEFAULT_CHUNK_EVENTS, attrs=None):
+        self.path = os.path.abspath(path)
+        self.chunk_events = chunk_events
+        self.attrs = dict(attrs or {})
+        self.num_events = 0
+        self.num_hours = 0
+
+        self._tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        if os.path.exists(self._tmp_path):
+            shutil.rmtree(self._tmp_path)
+        os.makedirs(self._tmp_path)
+        columns = [*EVENT_COLUMNS, *HOUR_COLUMNS, COUNTS_COLUMN]
+        self._files = {name: open(os.path.join(self._tmp_path, f"{name}.bin"), "wb") for name in columns}
+        self._buffers = {name: [] for name in columns}
+        self._buffered_events = 0
+        self._buffered_hours = 0
+
+    def record_infections(self, hour, sources, targets, etypes):
+        """
+        buffers the infections of targets by sources over edges of type etypes during hour
+        """
+        targets = np.asarray(targets)
+        if not len(targets):
+            return
+        self._buffers["event_hour"].append(np.broadcast_to(np.asarray(hour, dtype=np.int32), targets.shape))
+        self._buffers["event_source"].append(np.broadcast_to(np.asarray(sources, dtype=np.int32), targets.shape))
+        self._buffers["event_target"].append(targets.astype(np.int32, copy=False))
+        self._buffers["event_etype"].append(np.broadcast_to(np.asarray(etypes, dtype=np.uint8), targets.shape))
+        self._buffered_events += len(targets)
+        self.num_events += len(targets)
+        if self._buffered_events >= self.chunk_events:
+            self.flush()
+
+    def record_seeds(self, hour, targets):
+        """
+        buffers the infection of targets from outside the graph
+        """
+        self.record_infections(hour, -1, targets, SEED_EDGE_TYPE)
+
+    def record_hour(self, hour, counts, new_infections, contacts):
+        """
+        buffers the aggregates of hour: compartment counts at its end, infections and contacts made in it
+        """
+        self._buffers["hour"].append(np.array([hour], dtype=np.int32))
+        self._buffers["hour_new_infections"].append(np.array([new_infections], dtype=np.int64))
+        self._buffers["hour_contacts"].append(np.array([contacts], dtype=np.int64))
+        self._buffers[COUNTS_COLUMN].append(np.asarray(counts, dtype=np.int64).reshape(1, len(COMPARTMENTS)))
+        self._buffered_hours += 1
+        self.num_hours += 1
+        if self._buffered_hours >= self.chunk_events:
+            self.flush()
+
+    def flush(self):
+        """
+        appends the buffered records to the column files
+        """
+        for name, buffer in self._buffers.items():
+            if buffer:
+                column = np.concatenate(buffer)
+                column.astype(column.dtype.newbyteorder("<"), copy=False).tofile(self._files[name])
+                buffer.clear()
+        self._buffered_events = 0
+        self._buffered_hours = 0
+
+    def close(self):
+        """
+        writes the remaining records and the manifest and moves the log into place
+        """
+        if self._files is None:
+            return
+        self.flush()
+        for file in self._files.values():
+            file.close()
+        self._files = None
+
+        arrays = {name: (dtype, (self.num_events,)) for name, dtype in EVENT_COLUMNS.items()}
+        arrays.update({name: (dtype, (self.num_hours,)) for name, dtype in HOUR_COLUMNS.items()})
+        arrays[COUNTS_COLUMN] = (np.int64, (self.num_hours, len(COMPARTMENTS)))
+        write_manifest(self._tmp_path, "event_log", arrays,
+                       {**self.attrs, "compartments": list(COMPARTMENTS), "seed_edge_type": SEED_EDGE_TYPE})
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_event_log(path, mmap=True):
+    """
+    returns (columns, attrs) of a log written by EventLogWriter, the columns being memory-mapped by default
+    """
+    return load_arrays(path, "event_log", mmap)
+
+
+def infections_by_hour(columns):
+    """
+    Replays a log: yields (hour, sources, targets, etypes) for every hour that has infection events,
+    in order. Events are logged in time order, so every hour is a contiguous slice of the event columns.
+    """
+    hours = columns["event_hour"]
+    if not len(hours):
+        return
+    bounds = np.flatnonzero(np.diff(hours)) + 1
+    starts = np.concatenate([[0], bounds])
+    ends = np.concatenate([bounds, [len(hours)]])
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        yield (int(hours[start]), columns["event_source"][start:end], columns["event_target"][start:end],
+               columns["event_etype"][start:end])
@@ -0,0 +1,242 @@
+import heapq
+import math
+
+import numpy as np
+
+from compartment_model import COMPARTMENTS, DEAD, EXPOSED, INFECTED, RECOVERED, SUSCEPTIBLE, CompartmentModel
+from simulation import ETP, MAX_CONTACTS_PER_HOUR
+
+# kinds of queued events
+CONTACT = 0
+TRANSITION = 1
+
+# uniform draws are taken from the generator in blocks of this size
+RANDOM_BLOCK = 1 << 14
+
+
+class EventSimulation:
+    """
+    Continuous-time, event-driven counterpart of simulation.Simulation (next-reaction method).
+
+    An edge with contact probability CP carries contacts at the rate -ln(1 - CP) per hour, so it has at least
+    one contact in an hour with probability CP, as in the hourly model. Every infectious node has one queued
+    contact event, drawn from the total rate of its edges to susceptible neighbours: when it fires, the
+    neighbour is picked in proportion to its edge's rate and infected with ETP(TP, CI). Rates are only bounded
+    when an event is queued (they can only decrease as neighbours get infected) and an event is kept with
+    probability current rate / bound, so nothing has to be rescheduled when a neighbour gets infected.
+    A node makes at most max_contacts_per_hour contacts in a clock hour, after that its next contact is
+    drawn from the start of the next hour.
+
+    Compartment changes happen on hour boundaries like in the hourly model: dwell times count from the hour
+    a node got infected (or became infectious) in and a node infected by a contact during hour h makes its
+    first contact in hour h + 1, nodes infected with infect() can make contacts at once.
+    Hours in which nothing happens cost nothing, which makes low-prevalence phases much faster than with the
+    hourly model.
+
+    log (an event_log.EventLogWriter) receives every infection, in the clock hour it happened in, and the
+    aggregates of every hour run.
+    """
+
+    def __init__(self, graph, rng=None, max_contacts_per_hour=MAX_CONTACTS_PER_HOUR, model=None, etp=None,
+                 log=None):
+        self.rng = np.random.default_rng(rng)
+        self.num_nodes = graph.num_nodes
+        self.indptr = np.asarray(graph.indptr)
+        self.indices = np.asarray(graph.indices)
+        self.etype = np.asarray(graph.etype)
+        self.rate = -np.log1p(-np.asarray(graph.cp, dtype=np.float64))
+        self.etp = etp if etp is not None else ETP(np.asarray(graph.tp), np.asarray(graph.ci)).astype(np.float32)
+        self.max_contacts_per_hour = max_contacts_per_hour
+        self.model = model if model is not None else CompartmentModel.si()
+        self.log = log
+
+        self.state = np.zeros(self.num_nodes, dtype=np.uint8)
+        self.infection_time = np.full(self.num_nodes, np.nan)
+        self.counts = np.zeros(len(COMPARTMENTS), dtype=np.int64)
+        self.counts[SUSCEPTIBLE] = self.num_nodes
+        self.susceptible_neighbors = np.diff(self.indptr).astype(np.int32)
+        self.infected = []
+
+        self.time = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.events = 0
+        # infections and contacts in the current clock hour
+        self._hour_infections = 0
+        self._hour_contacts = 0
+
+        # node -> (clock hour, contacts made in it)
+        self._contact_hour = {}
+        self._queue = []
+        self._sequence = 0
+        self._uniform = np.zeros(0)
+        self._next_uniform = 0
+
+    @property
+    def num_infected(self):
+        return len(self.infected)
+
+    @property
+    def num_infectious(self):
+        return int(self.counts[INFECTED])
+
+    @property
+    def finished(self):
+        return not self._queue
+
+    def compartment_counts(self):
+        return {name: int(self.counts[COMPARTMENTS.index(name)]) for name in self.model.compartments}
+
+    def _random(self):
+        if self._next_uniform == len(self._uniform):
+            self._uniform = self.rng.random(RANDOM_BLOCK)
+            self._next_uniform = 0
+        self._next_uniform += 1
+        return self._uniform[self._next_uniform - 1]
+
+    def _push(self, time, kind, node, bound=0.0):
+        heapq.heappush(self._queue, (time, self._sequence, kind, node, bound))
+        self._sequence += 1
+
+    def _move(self, node, state):
+        self.counts[self.state[node]] -= 1
+        self.counts[state] += 1
+        self.state[node] = state
+
+    def _susceptible_rates(self, node):
+        """
+        returns (start, rates): the first CSR entry of node and the contact rates of its edges, 0 for the edges
+        to nodes that are not susceptible
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return start, self.rate[start:end] * (self.state[self.indices[start:end]] == SUSCEPTIBLE)
+
+    def _schedule_contact(self, node, after, bound=None):
+        """
+        queues the next contact of node after the time after, unless it has no susceptible neighbour left.
+        bound is the total contact rate of node if known.
+        """
+        if not self.susceptible_neighbors[node]:
+            return
+        if bound is None:
+            bound = float(self._susceptible_rates(node)[1].sum())
+        if bound > 0:
+            self._push(after - math.log(1.0 - self._random()) / bound, CONTACT, node, bound)
+
+    def _schedule_transition(self, node, hour, dwell_time):
+        self._push(float(hour + dwell_time.sample(1, self.rng)[0]), TRANSITION, node)
+
+    def infect(self, nodes):
+        """
+        infects the susceptible nodes among nodes at the current time, returns them
+        """
+        infected = []
+        for node in np.atleast_1d(np.asarray(nodes, dtype=np.int64)).tolist():
+            if self.state[node] == SUSCEPTIBLE:
+                self._infect(node, self.time)
+                infected.append(node)
+        infected = np.array(infected, dtype=np.int32)
+        if self.log is not None:
+            self.log.record_seeds(math.floor(self.time), infected)
+        return infected
+
+    def _infect(self, node, first_contact):
+        self.infection_time[node] = self.time
+        self.infected.append(node)
+        self.susceptible_neighbors[self.indices[self.indptr[node]:self.indptr[node + 1]]] -= 1
+
+        hour = math.floor(self.time)
+        if self.model.exposed is not None:
+            self._move(node, EXPOSED)
+            self._schedule_transition(node, hour, self.model.exposed)
+        else:
+            self._become_infectious(node, first_contact, hour)
+
+    def _become_infectious(self, node, first_contact, hour):
+        self._move(node, INFECTED)
+        self._schedule_contact(node, first_contact)
+        if self.model.infectious is not None:
+            self._schedule_transition(node, hour, self.model.infectious)
+
+    def _transition(self, node):
+        if self.state[node] == EXPOSED:
+            self._become_infectious(node, self.time, int(self.time))
+            return
+        self._contact_hour.pop(node, None)
+        if self.rng.random() < self.model.fatality:
+            self._move(node, DEAD)
+        else:
+            self._move(node, RECOVERED)
+
+    def _contact(self, node, bound):
+        if self.state[node] != INFECTED:
+            return
+        start, rates = self._susceptible_rates(node)
+        cumulative = np.cumsum(rates)
+        total = float(cumulative[-1]) if len(cumulative) else 0.0
+        if total <= 0:
+            return
+        if self._random() * bound >= total:
+            # thinned, the rate went down since the event was queued
+            self._schedule_contact(node, self.time, total)
+            return
+
+        k = min(int(np.searchsorted(cumulative, self._random() * total, side="right")), len(rates) - 1)
+        entry = start + k
+        target = int(self.indices[entry])
+        hour = math.floor(self.time)
+        self._hour_contacts += 1
+        if self._random() < self.etp[entry]:
+            self.hits += 1
+            self._hour_infections += 1
+            self._infect(target, float(hour + 1))
+            total -= float(rates[k])
+            if self.log is not None:
+                self.log.record_infections(hour, node, [target], self.etype[entry])
+        else:
+            self.misses += 1
+
+        contact_hour, contacts = self._contact_hour.get(node, (hour, 0))
+        contacts = contacts + 1 if contact_hour == hour else 1
+        self._contact_hour[node] = (hour, contacts)
+        self._schedule_contact(node, float(hour + 1) if contacts >= self.max_contacts_per_hour else self.time, total)
+
+    def _end_hour(self, hour, history):
+        history.append(self.counts.copy())
+        if self.log is not None:
+            self.log.record_hour(hour, self.counts, self._hour_infections, self._hour_contacts)
+        self._hour_infections = 0
+        self._hour_contacts = 0
+
+    def run(self, hours=None):
+        """
+        Processes events until none is left or, if hours is given, until hours hours from now have passed.
+        returns the compartment counts (columns in COMPARTMENTS order) at the end of every clock hour,
+        like Simulation.run: the last row is the hour of the last event if the outbreak ends before the horizon
+        """
+        hour = math.floor(self.time)
+        end = hour + hours if hours is not None else None
+        history = []
+        processed = False
+        while self._queue and (end is None or self._queue[0][0] < end):
+            time, _, kind, node, bound = heapq.heappop(self._queue)
+            while time >= hour + 1:
+                self._end_hour(hour, history)
+                hour += 1
+            self.time = time
+            self.events += 1
+            processed = True
+            if kind == CONTACT:
+                self._contact(node, bound)
+            else:
+                self._transition(node)
+
+        # up to the horizon while events are pending, otherwise up to the hour of the last event
+        last_hour = end if self._queue else hour + processed
+        while hour < last_hour:
+            self._end_hour(hour, history)
+            hour += 1
+        self.time = max(self.time, float(hour))
+        if not history:
+            return np.zeros((0, len(COMPARTMENTS)), dtype=np.int64)
+        return np.array(history)
@@ -0,0 +1,428 @@
+import heapq
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation_revised"))
+from group_membership import expand_ranges
+
+from compartment_model import COMPARTMENTS, DEAD, EXPOSED, INFECTED, RECOVERED, SUSCEPTIBLE, CompartmentModel
+
+# maximum number of people that a node can infect in an hour
+MAX_CONTACTS_PER_HOUR = 1
+
+# upper bound on the adjacency entries expanded at once, keeps the per-hour temporaries bounded on large graphs
+MAX_ENTRIES_PER_BATCH = 1 << 22
+
+
+def event_occurs(prob, rng):
+    """
+    Vectorized event_occurs: one Bernoulli draw per element of prob.
+    """
+    return rng.random(np.shape(prob)) < prob
+
+
+def ETP(TP, CI):
+    """
+    Effective transmission probability of a contact, element-wise over arrays of TP and CI.
+    """
+    return np.where(CI == 1, TP, TP + (1 - TP) / (10 * CI))
+
+
+def scatter_add(array, index, value=1):
+    """
+    array[index] += value where repeated indices add up, like np.add.at but without its per-element cost
+    """
+    if len(index) > len(array) // 8:
+        array += (value * np.bincount(index, minlength=len(array))).astype(array.dtype)
+    else:
+        unique, counts = np.unique(index, return_counts=True)
+        array[unique] += (value * counts).astype(array.dtype)
+
+
+class Simulation:
+    """
+    Hourly discrete-time outbreak over a CSR graph (see graph_arrays.CSRGraph).
+
+    Every hour each infected node walks its neighbours in order and contacts susceptible ones with the edge's
+    CP, stopping after MAX_CONTACTS_PER_HOUR contacts. A contact infects the neighbour with ETP(TP, CI).
+    The infected nodes of the hour are processed together: the contact draws of all their edges are made in
+    one call, then contacts on a neighbour that an earlier node (in infection order) infected in the same pass
+    are dropped and their nodes resume their walk from there in another pass. The outcome follows the
+    node-by-node loop of testing.py, only nodes that resume can see infections of later nodes.
+
+    Only the active frontier transmits: susceptible_neighbors counts the susceptible neighbours of every node
+    and infected nodes whose count drops to 0 are retired from active, as they can never make a contact again.
+    The cost of an hour follows the number of active transmitters, not the number of cases so far.
+
+    Infected nodes then go through the compartments of model (see compartment_model.CompartmentModel).
+    Dwell times are drawn per batch of nodes entering a compartment, the hour a node leaves its compartment is
+    kept in transition_hour and the nodes leaving at the same hour are stored together in a calendar,
+    so hours cost nothing for nodes waiting on their timer. An hour with no active node jumps to the next
+    transition and the outbreak is over once there is neither an active node nor a pending transition.
+
+    log (an event_log.EventLogWriter) receives every infection (hour, source, target, edge type) and the
+    aggregates of every hour, the hours skipped while idle included.
+    """
+
+    # independent outbreaks simulated together, see BatchedSimulation
+    replicates = 1
+
+    def __init__(self, graph, rng=None, max_contacts_per_hour=MAX_CONTACTS_PER_HOUR, model=None, etp=None,
+                 log=None):
+        self.rng = np.random.default_rng(rng)
+        self.graph_num_nodes = graph.num_nodes
+        # length of the per-node arrays (state, contacts, timers, ...)
+        self.num_nodes = graph.num_nodes * self.replicates
+        self.indptr = np.asarray(graph.indptr)
+        self.indices = np.asarray(graph.indices)
+        self.etype = np.asarray(graph.etype)
+        self.cp = np.asarray(graph.cp)
+        # etp can be passed precomputed (e.g. memory-mapped, see ensemble.py) to share it between simulations
+        self.etp = etp if etp is not None else ETP(np.asarray(graph.tp), np.asarray(graph.ci)).astype(np.float32)
+        self.max_contacts_per_hour = max_contacts_per_hour
+        self.model = model if model is not None else CompartmentModel.si()
+        self.log = log
+
+        self.state = np.zeros(self.num_nodes, dtype=np.uint8)
+        self.contacts = np.zeros(self.num_nodes, dtype=np.int32)
+        self.infection_hour = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.transition_hour = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.counts = np.zeros(len(COMPARTMENTS), dtype=np.int64)
+        self.counts[SUSCEPTIBLE] = self.num_nodes
+        self.active = np.zeros(0, dtype=np.int32)
+        self.susceptible_neighbors = self._degrees()
+
+        # nodes in infection order, the first num_infected entries are used
+        self._infected = np.zeros(self.num_nodes, dtype=np.int32)
+        self._num_infected = 0
+        # hour -> node arrays leaving their compartment at that hour, the hours are also kept in a heap
+        self._calendar = {}
+        self._calendar_hours = []
+        # nodes whose contacts counter is not 0
+        self._contacted = []
+
+        self.hour = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def infected(self):
+        """
+        returns every node infected so far, in infection order
+        """
+        return self._infected[:self._num_infected]
+
+    @property
+    def num_infected(self):
+        return self._num_infected
+
+    @property
+    def num_infectious(self):
+        return int(self.counts[INFECTED])
+
+    def _degrees(self):
+        return np.diff(self.indptr).astype(np.int32)
+
+    def _graph_nodes(self, nodes):
+        """
+        returns (graph_nodes, offsets): the graph node of every node and what to add to a graph node id
+        to get the id of its neighbours (None when node ids are graph node ids)
+        """
+        return nodes, None
+
+    def _adjacency(self, nodes, starts=None):
+        """
+        returns (segment, entries, segment_starts, neighbors) of the adjacency of nodes (see
+        group_membership.expand_ranges), walking the adjacency of nodes[i] from the CSR entry starts[i] (default: from its first neighbour)
+        """
+        graph_nodes, offsets = self._graph_nodes(nodes)
+        if starts is None:
+            starts = self.indptr[graph_nodes]
+        segment, entries, segment_starts = expand_ranges(starts, self.indptr[graph_nodes + 1], segments=True)
+        neighbors = self.indices[entries]
+        if offsets is not None:
+            neighbors = neighbors + offsets[segment]
+        return segment, entries, segment_starts, neighbors
+
+    def compartment_counts(self):
+        """
+        returns {compartment name: number of nodes in it} for the compartments of the model
+        """
+        return {name: int(self.counts[COMPARTMENTS.index(name)]) for name in self.model.compartments}
+
+    @property
+    def finished(self):
+        """
+        True once nothing can change anymore: no node can transmit and no timer is pending
+        """
+        return not len(self.active) and not self._calendar
+
+    def _move(self, nodes, state):
+        self.counts -= np.bincount(self.state[nodes], minlength=len(COMPARTMENTS))
+        self.counts[state] += len(nodes)
+        self.state[nodes] = state
+
+    def _schedule(self, nodes, dwell_time):
+        """
+        sets the timers of nodes to a dwell time drawn from dwell_time
+        """
+        hours = self.hour + dwell_time.sample(len(nodes), self.rng)
+        self.transition_hour[nodes] = hours
+        order = np.argsort(hours, kind="stable")
+        unique_hours, starts = np.unique(hours[order], return_index=True)
+        for hour, group in zip(unique_hours.tolist(), np.split(nodes[order], starts[1:])):
+            if hour not in self._calendar:
+                self._calendar[hour] = []
+                heapq.heappush(self._calendar_hours, hour)
+            self._calendar[hour].append(group)
+
+    def infect(self, nodes):
+        """
+        infects the susceptible nodes among nodes from outside the graph, returns them
+        """
+        nodes = self._infect(nodes)
+        if self.log is not None:
+            self.log.record_seeds(self.hour, nodes)
+        return nodes
+
+    def _infect(self, nodes):
+        nodes = np.asarray(nodes, dtype=np.int32)
+        nodes = nodes[self.state[nodes] == SUSCEPTIBLE]
+        self.infection_hour[nodes] = self.hour
+        self._infected[self._num_infected:self._num_infected + len(nodes)] = nodes
+        self._num_infected += len(nodes)
+
+        scatter_add(self.susceptible_neighbors, self._adjacency(nodes)[3], -1)
+
+        if self.model.exposed is not None:
+            self._move(nodes, EXPOSED)
+            self._schedule(nodes, self.model.exposed)
+        else:
+            self._become_infectious(nodes)
+        return nodes
+
+    def _become_infectious(self, nodes):
+        self._move(nodes, INFECTED)
+        self.active = np.concatenate([self.active, nodes[self.susceptible_neighbors[nodes] > 0]])
+        if self.model.infectious is not None:
+            self._schedule(nodes, self.model.infectious)
+
+    def _advance_timers(self):
+        """
+        moves the nodes whose timer ends this hour to their next compartment
+        """
+        if not self._calendar_hours or self._calendar_hours[0] != self.hour:
+            return
+        heapq.heappop(self._calendar_hours)
+        nodes = np.concatenate(self._calendar.pop(self.hour))
+        self.transition_hour[nodes] = -1
+
+        exposed = self.state[nodes] == EXPOSED
+        self._become_infectious(nodes[exposed])
+
+        leaving = nodes[~exposed]
+        dies = self.rng.random(len(leaving)) < self.model.fatality
+        self._move(leaving[dies], DEAD)
+        self._move(leaving[~dies], RECOVERED)
+
+    def _idle(self):
+        """
+        True when no node is active and the next transition is after this hour
+        """
+        return not len(self.active) and bool(self._calendar_hours) and self._calendar_hours[0] > self.hour
+
+    def _skip_idle(self, hour):
+        """
+        Jumps to hour, nothing happens in the hours skipped. returns their compartment counts, which
+        also go to the log one row per hour, as if they had been stepped.
+        """
+        skipped = [self.counts.copy()] * (hour - self.hour)
+        if self.log is not None:
+            counts = self.counts.reshape(-1, len(COMPARTMENTS)).sum(axis=0)
+            for skipped_hour in range(self.hour, hour):
+                self.log.record_hour(skipped_hour, counts, 0, 0)
+        self.hour = hour
+        return skipped
+
+    def retire(self):
+        """
+        drops the active nodes that stopped being infectious or have no susceptible neighbour left
+        """
+        active = self.active
+        self.active = active[(self.state[active] == INFECTED) & (self.susceptible_neighbors[active] > 0)]
+
+    def transmitters(self):
+        """
+        returns the nodes that try to transmit this hour, in infection order
+        """
+        return self.active
+
+    def _batches(self, sources):
+        """
+        splits sources into consecutive runs whose adjacency fits in MAX_ENTRIES_PER_BATCH entries
+        """
+        graph_nodes, _ = self._graph_nodes(sources)
+        degrees = self.indptr[graph_nodes + 1] - self.indptr[graph_nodes]
+        batch_of = np.cumsum(degrees) // MAX_ENTRIES_PER_BATCH
+        bounds = np.flatnonzero(np.diff(batch_of)) + 1
+        return np.split(sources, bounds)
+
+    def contact_events(self, sources, starts=None):
+        """
+        Draws the contacts of sources against the current states, walking the adjacency of sources[i]
+        from the CSR entry starts[i] (default: from its first neighbour).
+        returns (segment, target, entry) arrays, one element per contact, in source then neighbour order,
+        segment being the position of the contact's source in sources and entry the CSR entry of the edge
+        """
+        segment, entries, segment_starts, targets = self._adjacency(sources, starts)
+        attempt = (self.state[targets] == SUSCEPTIBLE) & event_occurs(self.cp[entries], self.rng)
+
+        # rank of every attempt among the attempts of its source, in neighbour order
+        attempts_before = np.concatenate([[0], np.cumsum(attempt)])
+        rank = attempts_before[:-1] - attempts_before[segment_starts][segment]
+        contact = attempt & (rank < self.max_contacts_per_hour - self.contacts[sources][segment])
+
+        return segment[contact], targets[contact], entries[contact]
+
+    def _transmit(self, sources):
+        """
+        Makes the contacts of sources, in passes until no contact is dropped. returns the nodes infected
+        """
+        new_infections = []
+        starts = self.indptr[self._graph_nodes(sources)[0]].astype(np.int64)
+        while len(sources):
+            segment, target, entry = self.contact_events(sources, starts)
+            transmitted = event_occurs(self.etp[entry], self.rng)
+
+            # per target, contacts after the first transmitting one (in source order) found it infected
+            order = np.lexsort((np.arange(len(target)), target))
+            first_of_target = np.ones(len(target), dtype=bool)
+            first_of_target[1:] = target[order][1:] != target[order][:-1]
+            group = np.cumsum(first_of_target) - 1
+            transmitted_before = np.cumsum(transmitted[order]) - transmitted[order]
+            group_transmitted_before = transmitted_before - transmitted_before[np.flatnonzero(first_of_target)][group]
+            dropped = np.zeros(len(target), dtype=bool)
+            dropped[order] = group_transmitted_before > 0
+
+            # a source with a dropped contact keeps only its contacts before it and resumes at the dropped entry
+            first_dropped = np.full(len(sources), np.iinfo(np.int64).max)
+            np.minimum.at(first_dropped, segment[dropped], entry[dropped])
+            kept = entry < first_dropped[segment]
+
+            source = sources[segment[kept]]
+            scatter_add(self.contacts, source)
+            scatter_add(self.contacts, target[kept])
+            self._contacted += [source, target[kept]]
+            self.hits += int(transmitted[kept].sum())
+            self.misses += int((~transmitted[kept]).sum())
+            infections = kept & transmitted
+            new_infections.append(self._infect(target[infections]))
+            if self.log is not None:
+                self.log.record_infections(self.hour, sources[segment[infections]], target[infections],
+                                           self.etype[entry[infections]])
+
+            resume = first_dropped < np.iinfo(np.int64).max
+            sources, starts = sources[resume], first_dropped[resume]
+        if not new_infections:
+            return np.zeros(0, dtype=np.int32)
+        return np.concatenate(new_infections)
+
+    def step(self):
+        """
+        Advances one hour, returns the nodes infected in it.
+        When no node is active the hours up to the next pending transition are skipped first.
+        """
+        if self._idle():
+            self._skip_idle(self._calendar_hours[0])
+        self._advance_timers()
+        self.retire()
+
+        contacts_before = self.hits + self.misses
+        new_infections = [self._transmit(sources) for sources in self._batches(self.transmitters())]
+        new_infections = np.concatenate(new_infections) if new_infections else np.zeros(0, dtype=np.int32)
+        self.retire()
+        if self._contacted:
+            self.contacts[np.concatenate(self._contacted)] = 0
+            self._contacted = []
+        if self.log is not None:
+            self.log.record_hour(self.hour, self.counts.reshape(-1, len(COMPARTMENTS)).sum(axis=0),
+                                 len(new_infections), self.hits + self.misses - contacts_before)
+        self.hour += 1
+        return new_infections
+
+    def run(self, hours=None):
+        """
+        Steps until the outbreak is over or, if hours is given, hours hours have passed.
+        returns the compartment counts (columns in COMPARTMENTS order) at the end of every hour
+        """
+        end = self.hour + hours if hours is not None else None
+        history = []
+        while not self.finished and (end is None or self.hour < end):
+            if self._idle():
+                # nothing happens until the next transition
+                skip_to = self._calendar_hours[0] if end is None else min(self._calendar_hours[0], end)
+                history += self._skip_idle(skip_to)
+                continue
+            self.step()
+            history.append(self.counts.copy())
+        if not history:
+            return np.zeros((0,) + self.counts.shape, dtype=np.int64)
+        return np.array(history)
+
+
+class BatchedSimulation(Simulation):
+    """
+    replicates independent outbreaks on the same graph advanced together, one hour of all of them
+    drawing its contacts and transmissions in the same vectorized calls.
+
+    Node n of replicate r is the node r * graph_num_nodes + n of a graph made of replicates disjoint copies
+    of graph. The copies are never materialized: the adjacency of a node is read from graph and its neighbours
+    are shifted into the node's replicate. states is the (replicates, graph_num_nodes) view of the flat state
+    array, counts has one row of compartment counts per replicate and the outbreak is finished once every
+    replicate is. A log gets the flat node ids and the counts summed over the replicates.
+    """
+
+    def __init__(self, graph, replicates, rng=None, max_contacts_per_hour=MAX_CONTACTS_PER_HOUR, model=None,
+                 etp=None, log=None):
+        if replicates * graph.num_nodes >= 2 ** 31:
+            raise ValueError("replicates * num_nodes must fit in int32 node ids")
+        self.replicates = replicates
+        super().__init__(graph, rng, max_contacts_per_hour, model, etp, log)
+        self.counts = np.zeros((replicates, len(COMPARTMENTS)), dtype=np.int64)
+        self.counts[:, SUSCEPTIBLE] = self.graph_num_nodes
+
+    @property
+    def states(self):
+        """
+        returns the (replicates, graph_num_nodes) state matrix
+        """
+        return self.state.reshape(self.replicates, self.graph_num_nodes)
+
+    @property
+    def num_infectious(self):
+        return self.counts[:, INFECTED].copy()
+
+    def compartment_counts(self):
+        return {name: self.counts[:, COMPARTMENTS.index(name)].copy() for name in self.model.compartments}
+
+    def _degrees(self):
+        return np.tile(np.diff(self.indptr).astype(np.int32), self.replicates)
+
+    def _graph_nodes(self, nodes):
+        offsets = nodes - nodes % self.graph_num_nodes
+        return nodes - offsets, offsets
+
+    def _move(self, nodes, state):
+        rows = (nodes // self.graph_num_nodes) * len(COMPARTMENTS)
+        scatter_add(self.counts.reshape(-1), rows + self.state[nodes], -1)
+        scatter_add(self.counts.reshape(-1), rows + state)
+        self.state[nodes] = state
+
+    def infect_replicates(self, nodes):
+        """
+        infects nodes[r] (a node id of the graph) in replicate r, returns the flat ids of the infected nodes
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return self.infect(np.arange(self.replicates, dtype=np.int64) * self.graph_num_nodes + nodes)
@@ -1,83 +1,37 @@
-import pickle
+import os
+import sys
 import time
 import random
 
-import networkx
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from graph_arrays import load_graph
+from compartment_model import CompartmentModel, DwellTime
+from event_log import EventLogWriter
+from simulation import Simulation
 
-# maximum number of people that a node can infect in an hour
-MAX_CONTACTS_PER_HOUR = 1
+G = load_graph("../network_generation/rs_graph")
 
-hits = 0
-misses = 0
+initial_infected = random.randint(0, G.num_nodes - 1)
 
-def event_occurs(prob):
-    return random.random() < prob
+# hours spent exposed and infectious
+model = CompartmentModel.seir(exposed=DwellTime("gamma", mean=48, sd=12),
+                              infectious=DwellTime("gamma", mean=120, sd=36))
 
-def ETP(TP, CI):
-    return TP if CI==1 else TP + (1-TP)/(10*CI)
+# infection events and hourly aggregates, replayable with event_log.read_event_log
+log = EventLogWriter("outbreak_log")
 
-with open("../network_generation/rs_graph.gpickle","rb") as file:
-    G:networkx.Graph = pickle.load(file)
+simulation = Simulation(G, model=model, log=log)
+simulation.infect([initial_infected])
 
-initial_infected = random.randint(0,99_999)
+while not simulation.finished:
 
-infected = [initial_infected]
-G.nodes[initial_infected]["type"] = "I"
-
-def refresh_hourly_contacts():
-    for node in G.nodes:
-        G.nodes[node]["contacts"] = 0
-
-
-refresh_hourly_contacts()
-h = 0
-while True:
-
-    ch,cm = hits, misses
+    ch, cm = simulation.hits, simulation.misses
     a = time.time()
 
-    num_infected = len(infected)
-
-    for i in range(num_infected):
-
-        infected_node = infected[i]
-
-        for adj_node in G.neighbors(infected_node):
-
-            if G.nodes[infected_node]["contacts"] >= MAX_CONTACTS_PER_HOUR:
-                break
-
-            edge = G[infected_node][adj_node]
-
-            if G.nodes[adj_node]["type"] == "S" and event_occurs(edge["CP"]):
-
-                G.nodes[infected_node]["contacts"] += 1
-                G.nodes[adj_node]["contacts"] += 1
-
-
-                if event_occurs(ETP(edge["TP"], edge["CI"])):
-                    hits += 1
-                    infected.append(adj_node)
-                    G.nodes[adj_node]["type"] = "I"
-                else:
-                    misses += 1
-
-
-    print("TRANSMIT METRICS", time.time() - a, h, len(infected))
-    print("SANITY CHECKS", hits-ch, misses-cm)
-    h+=1
-    refresh_hourly_contacts()
-
-
-
-
-
-
-
-
-
-
-
-
+    simulation.step()
 
+    print("TRANSMIT METRICS", time.time() - a, simulation.hour - 1, simulation.num_infected, simulation.num_infectious)
+    print("SANITY CHECKS", simulation.hits - ch, simulation.misses - cm)
 
+log.close()
+print("OUTBREAK OVER", simulation.hour, simulation.compartment_counts())
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from graph_arrays import MANIFEST_FILE, publish_directory
+
+
+def source_version(*modules):
+    """
+    Hash of the source files of the given modules, used as the code version of cached artifacts
+    so that changing a generator invalidates what it built.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        if isinstance(module, str):
+            module = sys.modules[module]
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def _canonical(value):
+    """
+    JSON-serializable form of generator parameters, seeds included.
+    """
+    if isinstance(value, np.random.SeedSequence):
+        return {"entropy": _canonical(value.entropy), "spawn_key": list(value.spawn_key)}
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache of generated artifacts (graphs, networks) on disk.
+
+    An artifact is stored under root/<key>, the key being a hash of the namespace, the generator parameters,
+    the seed and the code version. Artifacts are array directories (see graph_arrays.save_arrays), so a hit
+    is a memory-mapped load. Every hit refreshes the entry's mtime and once the cache is larger than quota_bytes
+    the least recently used entries are deleted.
+    """
+
+    def __init__(self, root, quota_bytes=20 * 1024 ** 3):
+        self.root = os.path.abspath(root)
+        self.quota_bytes = quota_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, namespace, params, seed, code_version):
+        if isinstance(seed, np.random.Generator):
+            # the stream a Generator produces depends on its state, which has no stable description
+            raise TypeError("cached artifacts need an int or SeedSequence seed, not a Generator")
+        description = json.dumps({"namespace": namespace, "params": _canonical(params),
+                                  "seed": _canonical(seed), "code_version": code_version}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def get_or_build(self, namespace, params, seed, code_version, build, save, load):
+        """
+        Returns load(path) of the cached artifact, building it with build(**params, seed=seed) and writing
+        it with save(path, artifact) on a miss. Nothing is cached when seed is None, as the result is random.
+        The artifact is saved to a directory of its own and published without replacing: when processes build
+        the same key at the same time the first one wins, and a published artifact never disappears.
+        """
+        if seed is None:
+            return build(**params, seed=seed)
+
+        path = self.path(self.key(namespace, params, seed, code_version))
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            os.utime(path)
+            print(f"[Cache] Hit {namespace} {os.path.basename(path)[:12]}")
+            return load(path)
+
+        print(f"[Cache] Miss {namespace} {os.path.basename(path)[:12]}, building")
+        build_path = f"{path}.build-{os.getpid()}"
+        save(build_path, build(**params, seed=seed))
+        publish_directory(build_path, path, overwrite=False)
+        self.evict(keep=path)
+        return load(path)
+
+    def entries(self):
+        """
+        returns [(path, size_bytes, last_used)] of the cached artifacts
+        """
+        entries = []
+        for entry in os.scandir(self.root):
+            # keys are hex digests, names with a "." are artifacts being written
+            if entry.is_dir() and "." not in entry.name and os.path.exists(os.path.join(entry.path, MANIFEST_FILE)):
+                entries.append((entry.path, _dir_size(entry.path), entry.stat().st_mtime))
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Deletes least recently used artifacts until the cache fits in quota_bytes, keep is never deleted.
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.quota_bytes:
+                break
+            if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            print(f"[Cache] Evicted {os.path.basename(path)[:12]}")
@@ -0,0 +1,226 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+# on-disk format: a directory with manifest.json and one raw little-endian file per array
+FORMAT_NAME = "daa-array-dir"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# edge types are stored as uint8 codes, EDGE_TYPES[code] is the name
+EDGE_TYPES = ("family", "friend", "work", "acquaintance")
+EDGE_TYPE_CODES = {edge_type: code for code, edge_type in enumerate(EDGE_TYPES)}
+
+
+class EdgeTable:
+    """
+    Undirected edges stored as aligned columns.
+
+    Edge i joins u[i] and v[i], has type EDGE_TYPES[etype[i]] and the parameters
+    tp[i] (transmission probability), ci[i] (closeness index) and cp[i] (contact probability).
+    """
+
+    def __init__(self, num_nodes, u, v, etype, tp, ci, cp):
+        self.num_nodes = num_nodes
+        self.u = np.asarray(u, dtype=np.int32)
+        self.v = np.asarray(v, dtype=np.int32)
+        self.etype = np.asarray(etype, dtype=np.uint8)
+        self.tp = np.asarray(tp, dtype=np.float32)
+        self.ci = np.asarray(ci, dtype=np.float32)
+        self.cp = np.asarray(cp, dtype=np.float32)
+
+    @property
+    def num_edges(self):
+        return len(self.u)
+
+    def to_networkx(self, edge_types=None):
+        """
+        Build a networkx Graph with the old attribute layout (node 'type', edge 'type', 'TP', 'CI', 'CP')
+        for code that still works on networkx graphs. edge_types optionally restricts the edge types copied.
+        """
+        # networkx is only needed here, importing it at the top would load it for every array user
+        import networkx as nx
+
+        G = nx.Graph()
+        G.add_nodes_from([(i, {'type': 'S'}) for i in range(self.num_nodes)])
+
+        mask = np.ones(self.num_edges, dtype=bool)
+        if edge_types is not None:
+            mask = np.isin(self.etype, [EDGE_TYPE_CODES[edge_type] for edge_type in edge_types])
+
+        # float32 -> float with the rounding the parameters were drawn with
+        tp = np.round(self.tp[mask].astype(np.float64), 2).tolist()
+        ci = np.round(self.ci[mask].astype(np.float64), 1).tolist()
+        cp = np.round(self.cp[mask].astype(np.float64), 2).tolist()
+        etype = [EDGE_TYPES[code] for code in self.etype[mask].tolist()]
+        G.add_edges_from(
+            (u, v, {'type': t, 'TP': a, 'CI': b, 'CP': c})
+            for u, v, t, a, b, c in zip(self.u[mask].tolist(), self.v[mask].tolist(), etype, tp, ci, cp)
+        )
+        return G
+
+
+class CSRGraph:
+    """
+    Undirected graph as a symmetric CSR adjacency.
+
+    The neighbours of node i are indices[indptr[i]:indptr[i+1]] (ascending), every edge is stored in both
+    directions and the edge columns etype, tp, ci and cp are aligned with indices, so the parameters of the
+    edge to indices[k] are tp[k], ci[k], cp[k].
+    clashes, if known, is the (len(EDGE_TYPES), len(EDGE_TYPES)) matrix of the edges dropped while the layers
+    were merged: clashes[a, b] edges of type b were dropped as their pair already had an edge of type a.
+    """
+
+    def __init__(self, num_nodes, indptr, indices, etype, tp, ci, cp, clashes=None):
+        self.num_nodes = num_nodes
+        self.indptr = indptr
+        self.indices = indices
+        self.etype = etype
+        self.tp = tp
+        self.ci = ci
+        self.cp = cp
+        self.clashes = clashes
+
+    @classmethod
+    def from_edge_table(cls, table: EdgeTable) -> "CSRGraph":
+        rows = np.concatenate([table.u, table.v])
+        cols = np.concatenate([table.v, table.u])
+        order = np.lexsort((cols, rows))
+        edge_ids = order % table.num_edges if table.num_edges else order
+
+        indptr = np.zeros(table.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=table.num_nodes), out=indptr[1:])
+        return cls(table.num_nodes, indptr, cols[order],
+                   table.etype[edge_ids], table.tp[edge_ids], table.ci[edge_ids], table.cp[edge_ids])
+
+    @property
+    def num_edges(self):
+        return len(self.indices) // 2
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def row_ids(self) -> np.ndarray:
+        """
+        returns the source node of every entry of indices
+        """
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), self.degree())
+
+    def to_edge_table(self) -> EdgeTable:
+        """
+        returns every edge once, as u < v
+        """
+        rows = self.row_ids()
+        upper = rows < self.indices
+        return EdgeTable(self.num_nodes, rows[upper], self.indices[upper], self.etype[upper],
+                         self.tp[upper], self.ci[upper], self.cp[upper])
+
+    def to_networkx(self, edge_types=None):
+        return self.to_edge_table().to_networkx(edge_types)
+
+
+def write_manifest(path, kind, arrays, attrs=None):
+    """
+    Write manifest.json of an array directory whose <name>.bin files are already written,
+    arrays maps every name to its (little-endian dtype, shape).
+    """
+    manifest = {"format": FORMAT_NAME, "version": FORMAT_VERSION, "kind": kind, "attrs": attrs or {},
+                "arrays": {name: {"file": f"{name}.bin", "dtype": np.dtype(dtype).newbyteorder("<").str,
+                                  "shape": list(shape)}
+                           for name, (dtype, shape) in arrays.items()}}
+    with open(os.path.join(path, MANIFEST_FILE), "w") as file:
+        json.dump(manifest, file, indent=1)
+
+
+def publish_directory(tmp_path, path, overwrite=True):
+    """
+    Move the finished directory tmp_path to path with a rename.
+    With overwrite an existing path is deleted first, so readers can find it missing for a moment. Without
+    overwrite an existing artifact at path wins and tmp_path is discarded, path is then never missing.
+    """
+    if overwrite and os.path.exists(path):
+        shutil.rmtree(path)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # renaming onto a non-empty directory fails, someone else published path first
+        if overwrite or not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            raise
+        shutil.rmtree(tmp_path)
+
+
+def save_arrays(path, kind, arrays, attrs=None, overwrite=True):
+    """
+    Write arrays to the directory path in the versioned array-directory format.
+
+    Every array is stored raw and little-endian in <name>.bin, manifest.json records the format, version,
+    kind (what the arrays describe, e.g. "csr_graph"), the dtype and shape of every array and the JSON attrs.
+    The directory is written next to path and renamed into place, so readers never see a partial artifact.
+    An existing directory at path is replaced, or kept as is without overwrite (see publish_directory).
+    """
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    specs = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        dtype = array.dtype.newbyteorder("<")
+        array.astype(dtype, copy=False).tofile(os.path.join(tmp_path, f"{name}.bin"))
+        specs[name] = (dtype, array.shape)
+    write_manifest(tmp_path, kind, specs, attrs)
+    publish_directory(tmp_path, path, overwrite)
+
+
+def load_arrays(path, kind=None, mmap=True):
+    """
+    Read a directory written by save_arrays, returns (arrays, attrs).
+
+    With mmap=True the arrays are read-only np.memmap views, loading takes milliseconds whatever the size and
+    processes that load the same directory share the pages through the page cache.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as file:
+        manifest = json.load(file)
+    if manifest.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a {FORMAT_NAME} directory")
+    if manifest["version"] > FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {manifest['version']}, "
+                         f"this code reads up to version {FORMAT_VERSION}")
+    if kind is not None and manifest["kind"] != kind:
+        raise ValueError(f"{path} holds a {manifest['kind']!r}, expected {kind!r}")
+
+    arrays = {}
+    for name, spec in manifest["arrays"].items():
+        file_path = os.path.join(path, spec["file"])
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        if mmap and np.prod(shape) > 0:
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode="r", shape=shape)
+        else:
+            arrays[name] = np.fromfile(file_path, dtype=dtype).reshape(shape)
+    return arrays, manifest["attrs"]
+
+
+def save_graph(path, graph: CSRGraph):
+    attrs = {"num_nodes": graph.num_nodes, "edge_types": list(EDGE_TYPES)}
+    if graph.clashes is not None:
+        attrs["clashes"] = np.asarray(graph.clashes).tolist()
+    save_arrays(path, "csr_graph",
+                {"indptr": graph.indptr, "indices": graph.indices, "etype": graph.etype,
+                 "tp": graph.tp, "ci": graph.ci, "cp": graph.cp}, attrs)
+
+
+def load_graph(path, mmap=True) -> CSRGraph:
+    arrays, attrs = load_arrays(path, "csr_graph", mmap)
+    if tuple(attrs["edge_types"]) != EDGE_TYPES:
+        raise ValueError(f"{path} uses edge types {attrs['edge_types']}, expected {list(EDGE_TYPES)}")
+    clashes = np.array(attrs["clashes"], dtype=np.int64) if "clashes" in attrs else None
+    return CSRGraph(attrs["num_nodes"], arrays["indptr"], arrays["indices"], arrays["etype"],
+                    arrays["tp"], arrays["ci"], arrays["cp"], clashes)
@@ -0,0 +1,127 @@
+import numpy as np
+
+from graph_arrays import EdgeTable, EDGE_TYPES
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+def edge_arrays(graph) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    returns (u, v, etype) of a CSRGraph or an EdgeTable, every edge once
+    """
+    if isinstance(graph, EdgeTable):
+        return graph.u, graph.v, graph.etype
+    rows = graph.row_ids()
+    indices = np.asarray(graph.indices)
+    upper = rows < indices
+    return rows[upper], indices[upper], np.asarray(graph.etype)[upper]
+
+
+def degrees_by_type(u, v, etype, num_nodes) -> np.ndarray:
+    """
+    returns the (len(EDGE_TYPES), num_nodes) degrees of every node in every edge type,
+    two bincounts over the edge ends instead of a loop over the edges
+    """
+    etype = np.asarray(etype, dtype=np.int64) * num_nodes
+    degrees = np.bincount(etype + u, minlength=len(EDGE_TYPES) * num_nodes)
+    degrees += np.bincount(etype + v, minlength=len(EDGE_TYPES) * num_nodes)
+    return degrees.reshape(len(EDGE_TYPES), num_nodes)
+
+
+def degree_summary(degrees, percentiles=DEFAULT_PERCENTILES) -> dict:
+    """
+    Summary of a degree array. mean, max, min and percentiles are over the nodes with at least one edge
+    (as the per-type figures of testing_graph always were), isolated counts the nodes without any.
+    """
+    histogram = np.bincount(degrees)
+    connected = degrees[degrees > 0]
+    summary = {
+        "edges": int(degrees.sum()) // 2,
+        "nodes": len(connected),
+        "isolated": len(degrees) - len(connected),
+        "histogram": histogram,
+    }
+    if len(connected):
+        summary.update({
+            "mean": float(connected.mean()),
+            "max": int(connected.max()),
+            "min": int(connected.min()),
+            "percentiles": dict(zip(percentiles, np.percentile(connected, percentiles).tolist())),
+        })
+    return summary
+
+
+def dedup_edges(u, v, etype, num_nodes) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keeps the first edge of every node pair, in edge order, of edges that were not deduplicated yet (e.g. the
+    layers of generate_graph or of group_edges.iter_group_edges). Every other edge of the pair is a clash.
+    returns (keep, clashes): the sorted indices of the kept edges and the (len(EDGE_TYPES), len(EDGE_TYPES))
+    matrix whose [a, b] counts the type b edges dropped because their pair already had a type a edge
+    """
+    num_types = len(EDGE_TYPES)
+    etype = np.asarray(etype, dtype=np.int64)
+    keys = np.minimum(u, v).astype(np.int64) * num_nodes + np.maximum(u, v)
+    # a stable sort keeps the edges of a pair in edge order, the first one of every run is kept
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    new_pair = np.ones(len(keys), dtype=bool)
+    new_pair[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_pair)
+    first = np.repeat(order[starts], np.diff(np.append(starts, len(keys))))
+
+    dropped = ~new_pair
+    clashes = np.bincount(etype[first[dropped]] * num_types + etype[order[dropped]],
+                          minlength=num_types * num_types)
+    return np.sort(order[starts]), clashes.reshape(num_types, num_types)
+
+
+def layer_clashes(u, v, etype, num_nodes) -> np.ndarray:
+    """
+    returns the clash matrix of dedup_edges, the one generate_graph records as CSRGraph.clashes
+    """
+    return dedup_edges(u, v, etype, num_nodes)[1]
+
+
+def graph_statistics(graph, percentiles=DEFAULT_PERCENTILES) -> dict:
+    """
+    Degree statistics of a CSRGraph or an EdgeTable: edge type name -> degree_summary of the degrees in that
+    type (types without edges are left out), "all" -> degree_summary of the total degrees, and "clashes".
+    A clash is an edge dropped because its node pair already had an edge (see dedup_edges). A CSRGraph has no
+    repeated pairs left, its clashes are the ones generate_graph recorded while merging the layers
+    (CSRGraph.clashes, None for graphs saved without them). For an EdgeTable they are layer_clashes.
+    """
+    u, v, etype = edge_arrays(graph)
+    degrees = degrees_by_type(u, v, etype, graph.num_nodes)
+    stats = {edge_type: degree_summary(degrees[code], percentiles)
+             for code, edge_type in enumerate(EDGE_TYPES) if degrees[code].any()}
+    stats["all"] = degree_summary(degrees.sum(axis=0), percentiles)
+    if isinstance(graph, EdgeTable):
+        stats["clashes"] = layer_clashes(u, v, etype, graph.num_nodes)
+    else:
+        stats["clashes"] = graph.clashes
+    return stats
+
+
+def print_statistics(stats: dict):
+    for name, summary in stats.items():
+        if name == "clashes":
+            continue
+        print(f"Edge type '{name}':" if name != "all" else "All edges:")
+        print(f"Total edges : {summary['edges']}")
+        print(f"  Isolated nodes: {summary['isolated']}")
+        if summary["nodes"]:
+            print(f"  Average per node: {summary['mean']:.2f}")
+            print(f"  Max per node: {summary['max']}")
+            print(f"  Min per node: {summary['min']}")
+            print("  Percentiles: " + ", ".join(f"p{p}={value:g}" for p, value in summary["percentiles"].items()))
+
+    clashes = stats["clashes"]
+    if clashes is None:
+        print("Layer clashes: not recorded with this graph")
+        return
+    print(f"Layer clashes (edges dropped): {int(np.sum(clashes))}")
+    for a, b in zip(*np.nonzero(clashes)):
+        if a == b:
+            print(f"Repeated {EDGE_TYPES[a]} edges: {clashes[a, b]}")
+        else:
+            print(f"{EDGE_TYPES[b]} edges dropped over {EDGE_TYPES[a]} edges: {clashes[a, b]}")
@@ -1,11 +1,33 @@
-import pickle
+import os
+import sys
 import time
-from random import random
+from concurrent.futures import ProcessPoolExecutor
 
-import networkx as nx
 import numpy as np
 
-def generate_edge_params(edge_type, seed=None):
+import graph_arrays
+import graph_stats
+from artifact_cache import ArtifactCache, source_version
+from graph_arrays import CSRGraph, EdgeTable, EDGE_TYPE_CODES, load_graph, save_graph
+from graph_stats import dedup_edges
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation_revised"))
+import random_streams
+from random_streams import seed_sequence_from
+
+
+# (low, high) of the uniform distributions of the edge parameters per edge type,
+# TP and CP are rounded to 2 decimals, CI to 1 decimal
+TP_RANGE = (0.3, 0.4)
+EDGE_PARAM_RANGES = {
+    'family': {'CI': (7.5, 10.0), 'CP': (0.5, 0.7)},
+    'friend': {'CI': (5.0, 7.5), 'CP': (0.3, 0.4)},
+    'work': {'CI': (2.5, 5.0), 'CP': (0.3, 0.5)},
+    'acquaintance': {'CI': (1.0, 2.5), 'CP': (0.05, 0.1)},
+}
+
+
+def generate_edge_params(edge_type, rng=None):
     """
     Return a dict of TP, CI, and CP for a single edge of given type.
 
@@ -13,37 +35,119 @@ def generate_edge_params(edge_type, seed=None):
     ----------
     edge_type : str
         One of 'family', 'friend', 'work', or 'acquaintance'.
-    seed : int or None
-        Random seed for reproducibility.
+    rng : numpy.random.Generator, int or None
+        Generator to draw from. Pass the same Generator for every edge,
+        an int seed builds a new Generator on every call.
 
     Returns
     -------
     dict
         {'TP': float, 'CI': float, 'CP': float}
     """
-    rng = np.random.default_rng(seed)
+    if edge_type not in EDGE_PARAM_RANGES:
+        raise ValueError(f"Unknown edge type: {edge_type!r}")
+    rng = np.random.default_rng(rng)
+    ranges = EDGE_PARAM_RANGES[edge_type]
     # Transmission probability
-    tp = round(rng.uniform(0.3, 0.4), 2)
-
+    tp = round(rng.uniform(*TP_RANGE), 2)
     # Closeness index (one decimal)
-    if edge_type == 'family':
-        ci = round(rng.uniform(7.5, 10.0), 1)
-        cp = round(rng.uniform(0.5, 0.7), 2)
-    elif edge_type == 'friend':
-        ci = round(rng.uniform(5.0, 7.5), 1)
-        cp = round(rng.uniform(0.3, 0.4), 2)
-    elif edge_type == 'work':
-        ci = round(rng.uniform(2.5, 5.0), 1)
-        cp = round(rng.uniform(0.3, 0.5), 2)
-    elif edge_type == 'acquaintance':
-        ci = round(rng.uniform(1.0, 2.5), 1)
-        cp = round(rng.uniform(0.05, 0.1), 2)
-    else:
-        raise ValueError(f"Unknown edge type: {edge_type!r}")
+    ci = round(rng.uniform(*ranges['CI']), 1)
+    cp = round(rng.uniform(*ranges['CP']), 2)
 
     return {'TP': tp, 'CI': ci, 'CP': cp}
 
 
+def generate_edge_params_batch(edge_type, size, rng=None):
+    """
+    Vectorized generate_edge_params, draws the parameters of size edges of the given type at once.
+
+    Returns
+    -------
+    dict
+        {'TP': float32 array, 'CI': float32 array, 'CP': float32 array}, each of length size
+    """
+    if edge_type not in EDGE_PARAM_RANGES:
+        raise ValueError(f"Unknown edge type: {edge_type!r}")
+    rng = np.random.default_rng(rng)
+    ranges = EDGE_PARAM_RANGES[edge_type]
+    return {
+        'TP': np.round(rng.uniform(*TP_RANGE, size), 2).astype(np.float32),
+        'CI': np.round(rng.uniform(*ranges['CI'], size), 1).astype(np.float32),
+        'CP': np.round(rng.uniform(*ranges['CP'], size), 2).astype(np.float32),
+    }
+
+
+def sample_family_sizes(num_nodes, avg_fam_size, standard_dev, rng):
+    """
+    Draw family sizes from a normal distribution (at least 1 each) until they cover num_nodes,
+    the last family is cut down so that the sizes sum to num_nodes exactly.
+    """
+    chunks = []
+    remaining = num_nodes
+    while remaining > 0:
+        draws = np.maximum(1, rng.normal(avg_fam_size, standard_dev, int(remaining / max(avg_fam_size, 1)) + 16)).astype(np.int64)
+        totals = np.cumsum(draws)
+        cut = int(np.searchsorted(totals, remaining))
+        if cut < len(draws):
+            draws = draws[:cut + 1]
+            draws[-1] -= totals[cut] - remaining
+            chunks.append(draws)
+            break
+        chunks.append(draws)
+        remaining -= int(totals[-1])
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+
+def intra_block_edges(starts, sizes, prob, rng):
+    """
+    Edges inside consecutive blocks of node ids (block i is starts[i] .. starts[i] + sizes[i] - 1),
+    every pair in a block is joined with probability prob, prob=1 makes every block a clique.
+    Blocks of the same size are expanded together with np.triu_indices.
+    """
+    us, vs = [], []
+    for size in np.unique(sizes):
+        if size < 2:
+            continue
+        block_starts = starts[sizes == size]
+        iu, ju = np.triu_indices(size, 1)
+        u = (block_starts[:, None] + iu).ravel()
+        v = (block_starts[:, None] + ju).ravel()
+        if prob < 1:
+            keep = rng.random(len(u)) < prob
+            u, v = u[keep], v[keep]
+        us.append(u)
+        vs.append(v)
+    if not us:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(us), np.concatenate(vs)
+
+
+def inter_block_edges(num_nodes, sizes, prob, rng):
+    """
+    Edges between different blocks, every such pair is joined with probability prob.
+    The number of edges is drawn from the binomial over all inter-block pairs and that many distinct pairs are
+    sampled uniformly by rejection, so memory stays proportional to the number of edges.
+    """
+    if prob <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    total_pairs = num_nodes * (num_nodes - 1) // 2 - int(np.sum(sizes * (sizes - 1) // 2))
+    num_edges = int(rng.binomial(total_pairs, prob))
+    block_of = np.repeat(np.arange(len(sizes)), sizes)
+
+    keys = np.zeros(0, dtype=np.uint64)
+    while len(keys) < num_edges:
+        draws = int((num_edges - len(keys)) * 1.1) + 16
+        a = rng.integers(num_nodes, size=draws)
+        b = rng.integers(num_nodes, size=draws)
+        valid = block_of[a] != block_of[b]
+        lo = np.minimum(a[valid], b[valid]).astype(np.uint64)
+        hi = np.maximum(a[valid], b[valid]).astype(np.uint64)
+        keys = np.unique(np.concatenate([keys, (lo << np.uint64(32)) | hi]))
+    if len(keys) > num_edges:
+        keys = rng.choice(keys, num_edges, replace=False)
+    return (keys >> np.uint64(32)).astype(np.int64), (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+
 def generate_family(num_nodes,
                     avg_fam_size,
                     standard_dev,
@@ -51,7 +155,11 @@ def generate_family(num_nodes,
                     intrafamily_prob,
                     seed=None):
     """
-    Generate family edges using an SBM with family sizes drawn from a normal distribution.
+    Generate family edges of a block model with family sizes drawn from a normal distribution.
+
+    Families are consecutive blocks of node ids. Pairs within a family are expanded directly from the size vector
+    (cliques for intrafamily_prob=1) and pairs between families are sampled sparsely, so no k x k probability
+    matrix is built and memory is proportional to the number of edges.
 
     Parameters
     ----------
@@ -65,77 +173,193 @@ def generate_family(num_nodes,
         Probability of edge between nodes in different families.
     intrafamily_prob : float
         Probability of edge between nodes within the same family.
-    seed : int or None
+    seed : int, SeedSequence, Generator or None
         Random seed for reproducibility.
 
     Returns
     -------
-    Graph
-        An undirected Graph with 'family' edges only.
-    list of int
-        The sampled family sizes.
+    tuple of ndarray
+        (u, v) arrays of the family edges.
     """
     # set seed for reproducibility
     rng = np.random.default_rng(seed)
     # sample family sizes and adjust to sum to num_nodes
-    sizes = []
-    remaining = num_nodes
-    while remaining > 0:
-        size = int(max(1, rng.normal(avg_fam_size, standard_dev)))
-        if size > remaining:
-            size = remaining
-        sizes.append(size)
-        remaining -= size
-    # build probability matrix
-    k = len(sizes)
-    p = np.full((k, k), interfamily_prob)
-    np.fill_diagonal(p, intrafamily_prob)
-    print(f"[Family] Sampling {k} families")
-    # generate SBM
-    sbm = nx.stochastic_block_model(sizes, p.tolist(), seed=seed)
-    G = nx.Graph()
-    G.add_nodes_from(range(num_nodes))
-    count = 0
-    for u, v in sbm.edges():
-        G.add_edge(u, v, type='family')
-        count += 1
-    print(f"[Family] Added {count} family edges.")
-    return G
+    sizes = sample_family_sizes(num_nodes, avg_fam_size, standard_dev, rng)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    print(f"[Family] Sampling {len(sizes)} families")
+
+    intra_u, intra_v = intra_block_edges(starts, sizes, intrafamily_prob, rng)
+    inter_u, inter_v = inter_block_edges(num_nodes, sizes, interfamily_prob, rng)
+    u = np.concatenate([intra_u, inter_u])
+    v = np.concatenate([intra_v, inter_v])
+    print(f"[Family] Added {len(u)} family edges.")
+    return u, v
+
+
+def barabasi_albert_edges(num_nodes, m, rng=None):
+    """
+    Barabási–Albert preferential attachment edges as (u, v) arrays, following networkx.barabasi_albert_graph:
+    a star on nodes 0..m, then every new node joins m distinct nodes drawn from the repeated-nodes array
+    (each node repeated once per edge it has).
+
+    The repeated-nodes array is never materialized. When node s is added the array has 2m(s-m) entries and
+    s appends its m targets followed by m copies of itself, so every draw is a position in an array whose layout
+    is known up front. All positions are drawn in one call and resolved together by following positions that land
+    on earlier targets back until they reach the star or a copy of a node. Rows whose targets are not distinct
+    redraw the repeated ones (rejection, like networkx) and everything is resolved again until all rows are distinct.
+    """
+    if m < 1 or m >= num_nodes:
+        raise ValueError(f"Barabási–Albert network must have m >= 1 and m < n, m = {m}, n = {num_nodes}")
+    rng = np.random.default_rng(rng)
+
+    # star: node 0 repeated m times, then nodes 1..m once
+    star = np.concatenate([np.zeros(m, dtype=np.int64), np.arange(1, m + 1, dtype=np.int64)])
+    sources = np.arange(m + 1, num_nodes, dtype=np.int64)
+    array_len = 2 * m * (sources - m)  # length of the repeated-nodes array when each source is added
+
+    positions = (rng.random((len(sources), m)) * array_len[:, None]).astype(np.int64).ravel()
+    row_len = np.repeat(array_len, m)
+
+    def resolve(slots):
+        """targets of the given slots under the current positions"""
+        targets = np.empty(len(slots), dtype=np.int64)
+        current = positions[slots]
+        pending = np.arange(len(slots))
+        while len(pending):
+            pos = current[pending]
+            in_star = pos < 2 * m
+            targets[pending[in_star]] = star[pos[in_star]]
+
+            block, offset = np.divmod(pos - 2 * m, 2 * m)
+            is_copy = ~in_star & (offset >= m)
+            targets[pending[is_copy]] = block[is_copy] + m + 1
+
+            follow = ~in_star & ~is_copy
+            pending = pending[follow]
+            current[pending] = positions[block[follow] * m + offset[follow]]
+        return targets
+
+    def repeated_slots(targets, rows):
+        """slots of the given rows holding a target already held by another slot of the row"""
+        slots = (rows[:, None] * m + np.arange(m)).ravel()
+        row_targets = targets[slots].reshape(-1, m)
+        order = np.argsort(row_targets, axis=1)
+        sorted_targets = np.take_along_axis(row_targets, order, axis=1)
+        repeated = np.zeros(row_targets.shape, dtype=bool)
+        np.put_along_axis(repeated, order[:, 1:], sorted_targets[:, 1:] == sorted_targets[:, :-1], axis=1)
+        return slots[repeated.ravel()]
+
+    all_slots = np.arange(len(positions))
+    all_rows = np.arange(len(sources))
+    targets = resolve(all_slots)
+    redraw = repeated_slots(targets, all_rows)
+    while len(redraw):
+        # redraw the repeated slots until their rows are distinct
+        while len(redraw):
+            positions[redraw] = (rng.random(len(redraw)) * row_len[redraw]).astype(np.int64)
+            targets[redraw] = resolve(redraw)
+            redraw = repeated_slots(targets, np.unique(redraw // m))
+        # later slots that were resolved through a redrawn slot change too, which can repeat targets again
+        targets = resolve(all_slots)
+        redraw = repeated_slots(targets, all_rows)
+
+    u = np.concatenate([np.zeros(m, dtype=np.int64), np.repeat(sources, m)])
+    v = np.concatenate([np.arange(1, m + 1, dtype=np.int64), targets])
+    return u, v
+
+
+def _gnp_rows(num_nodes, row_lo, row_hi, p, seed):
+    """
+    G(n, p) edges (u, v) with u in [row_lo, row_hi), v > u, by geometric skip sampling over the pairs of those rows
+    in row-major order of the upper triangle.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.arange(row_lo, row_hi + 1, dtype=np.int64)
+    # index of the first pair (r, r + 1) of row r in the row-major upper triangle
+    row_offsets = rows * (2 * num_nodes - rows - 1) // 2
+    start, end = int(row_offsets[0]), int(row_offsets[-1])
+
+    chunks = []
+    last = start - 1
+    while last < end:
+        expected = (end - last) * p
+        skips = rng.geometric(p, int(expected * 1.1) + 64)
+        pair_ids = last + np.cumsum(skips)
+        last = int(pair_ids[-1])
+        chunks.append(pair_ids[pair_ids < end])
+    pair_ids = np.concatenate(chunks)
+
+    row_index = np.searchsorted(row_offsets, pair_ids, side="right") - 1
+    u = rows[row_index]
+    v = u + 1 + (pair_ids - row_offsets[row_index])
+    return u, v
+
+
+# row chunks of gnp_edges, a constant so that the chunk seeds (and the edges) don't depend on workers
+GNP_CHUNKS = 16
+
+
+def gnp_edges(num_nodes, p, rng=None, workers=1, chunks=GNP_CHUNKS):
+    """
+    Erdős–Rényi G(n, p) edges as (u, v) arrays (u < v) by geometric skip sampling, so the cost is proportional
+    to the number of edges instead of the number of pairs.
+
+    The node range is split into chunks (GNP_CHUNKS by default) of rows with about the same number of pairs, each
+    sampled with its own child seed, so the result for a given rng and chunks doesn't depend on workers.
+    workers > 1 samples the chunks in a process pool.
+    """
+    if num_nodes < 2 or p <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if p >= 1:
+        u, v = np.triu_indices(num_nodes, 1)
+        return u.astype(np.int64), v.astype(np.int64)
+
+    total_pairs = num_nodes * (num_nodes - 1) // 2
+    rows = np.arange(num_nodes + 1, dtype=np.int64)
+    row_offsets = rows * (2 * num_nodes - rows - 1) // 2
+    bounds = np.unique(np.searchsorted(row_offsets, np.linspace(0, total_pairs, chunks + 1).astype(np.int64)))
+    bounds[-1] = num_nodes
+
+    seeds = seed_sequence_from(rng).spawn(len(bounds) - 1)
+    tasks = [(num_nodes, int(lo), int(hi), p, task_seed) for lo, hi, task_seed in zip(bounds[:-1], bounds[1:], seeds)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_gnp_rows, *zip(*tasks)))
+    else:
+        results = [_gnp_rows(*task) for task in tasks]
+    return np.concatenate([u for u, _ in results]), np.concatenate([v for _, v in results])
+
+
+def check_gnp_workers(num_nodes=100_000, p=3e-4, seed=0, workers=4) -> bool:
+    """
+    Check that gnp_edges gives the same edges with 1 and with workers processes for the same seed.
+    """
+    u1, v1 = gnp_edges(num_nodes, p, seed, workers=1)
+    u2, v2 = gnp_edges(num_nodes, p, seed, workers=workers)
+    return np.array_equal(u1, u2) and np.array_equal(v1, v2)
 
 
 def generate_scale_free(num_nodes, avg_degree, seed=None, edge_type='friend'):
     """
-    Generate scale-free edges (friend or work).
+    Generate scale-free edges (friend or work), returns (u, v) edge arrays.
     """
-    print(f"[{edge_type.capitalize()}] Generating scale-free  with avg_degree={avg_degree}, seed={seed}")
+    print(f"[{edge_type.capitalize()}] Generating scale-free  with avg_degree={avg_degree}")
 
     new_edges_added = int(avg_degree / 2)
-    sf = nx.barabasi_albert_graph(num_nodes, new_edges_added, seed=seed)
-    G = nx.Graph()
-    G.add_nodes_from(range(num_nodes))
-    count = 0
-    for u, v in sf.edges():
-        G.add_edge(u, v, type=edge_type)
-        count += 1
-    print(f"[{edge_type.capitalize()}] Added {count} edges.")
-    return G
+    u, v = barabasi_albert_edges(num_nodes, new_edges_added, seed)
+    print(f"[{edge_type.capitalize()}] Added {len(u)} edges.")
+    return u, v
 
 
-def generate_acquaintances(n, avg_degree, seed=None):
+def generate_acquaintances(n, avg_degree, seed=None, workers=1):
     """
-    Generate random acquaintance edges.
+    Generate random acquaintance edges, returns (u, v) edge arrays.
     """
-    print(f"[Acquaintance] Generating random graph with avg_degree={avg_degree}, seed={seed}")
+    print(f"[Acquaintance] Generating random graph with avg_degree={avg_degree}")
     p = avg_degree / (n - 1)
-    er = nx.fast_gnp_random_graph(n, p, seed=seed)
-    G = nx.Graph()
-    G.add_nodes_from(range(n))
-    count = 0
-    for u, v in er.edges():
-        G.add_edge(u, v, type='acquaintance')
-        count += 1
-    print(f"[Acquaintance] Added {count} edges.")
-    return G
+    u, v = gnp_edges(n, p, seed, workers=workers)
+    print(f"[Acquaintance] Added {len(u)} edges.")
+    return u, v
 
 
 def generate_graph(num_nodes,
@@ -146,59 +370,77 @@ def generate_graph(num_nodes,
                    avg_friend_degree,
                    avg_work_degree,
                    avg_acquaintance_degree,
-                   seed):
+                   seed,
+                   workers=1):
     """
     High-level graph generation combining multiple relationship types.
+
+    seed (int, SeedSequence, Generator or None, see seed_sequence_from) is split into one child stream per
+    layer and one for the edge parameters, so the same seed always gives the same graph.
+    workers > 1 samples the acquaintance layer in a process pool (see gnp_edges).
+
+    Every layer is generated as (u, v) edge arrays. Layers are merged in the order family, friend, work,
+    acquaintance: edges are packed into 64-bit keys and deduplicated with one np.unique, an edge already
+    present in an earlier layer (or earlier in the same layer) is dropped and counted as a clash.
+    The edge parameters of every layer are drawn in one generate_edge_params_batch call.
+
+    Returns a CSRGraph with edge type and parameter columns and the clash counts of the merge (clashes).
     """
     print(f"[Graph] Starting generation for n={num_nodes}")
-    G = nx.Graph()
-    G.add_nodes_from([(i, {'type': 'S'}) for i in range(num_nodes)])
-    clash_counter = 0
+    seed_sequence = seed_sequence_from(seed)
+    family_seed, friend_seed, work_seed, acquaintance_seed, params_seed = seed_sequence.spawn(5)
+    params_rng = np.random.default_rng(params_seed)
 
-    # family
-    print("[Graph] Generating family layer...")
-    fam = generate_family(num_nodes, avg_fam_size=avg_fam_size, standard_dev=family_standard_dev, interfamily_prob=interfamily_prob, intrafamily_prob=intrafamily_prob, seed=seed)
-    for u, v, d in fam.edges(data=True):
-            if G.has_edge(u, v):
-                clash_counter += 1
-            else:
-                G.add_edge(u, v, **d, **generate_edge_params("family", seed))
-    print("[Graph] Family layer merged.")
+    layers = []
 
-    # friends
+    print("[Graph] Generating family layer...")
+    layers.append(("family", generate_family(num_nodes, avg_fam_size=avg_fam_size, standard_dev=family_standard_dev, interfamily_prob=interfamily_prob, intrafamily_prob=intrafamily_prob, seed=family_seed)))
 
     print("[Graph] Generating friend layer...")
-    fr = generate_scale_free(num_nodes, avg_degree=avg_friend_degree, edge_type="friend", seed=seed)
-    for u, v, d in fr.edges(data=True):
-            if G.has_edge(u, v):
-                clash_counter += 1
-            else:
-                G.add_edge(u, v, **d,**generate_edge_params("friend", seed))
-    print("[Graph] Friend layer merged.")
-
-    # work
+    layers.append(("friend", generate_scale_free(num_nodes, avg_degree=avg_friend_degree, edge_type="friend", seed=friend_seed)))
+
     print("[Graph] Generating work layer...")
-    wk = generate_scale_free(num_nodes, avg_degree=avg_work_degree, edge_type="work", seed=seed)
-    for u, v, d in wk.edges(data=True):
-        if G.has_edge(u, v):
-                clash_counter += 1
-        else:
-                G.add_edge(u, v, **d,**generate_edge_params("work", seed))
-    print("[Graph] Work layer merged.")
+    layers.append(("work", generate_scale_free(num_nodes, avg_degree=avg_work_degree, edge_type="work", seed=work_seed)))
 
-    # acquaintances
-    ac = generate_acquaintances(num_nodes,avg_degree=avg_acquaintance_degree, seed=seed)
-    for u, v, d in ac.edges(data=True):
-            if G.has_edge(u, v):
-                clash_counter += 1
-            else:
-                G.add_edge(u, v, **d,**generate_edge_params("acquaintance", seed))
-    print("[Graph] Acquaintance layer merged.")
+    print("[Graph] Generating acquaintance layer...")
+    layers.append(("acquaintance", generate_acquaintances(num_nodes, avg_degree=avg_acquaintance_degree, seed=acquaintance_seed, workers=workers)))
 
-    print(f"[Graph] Edge-add clashes: {clash_counter}")
-    return G
+    u = np.concatenate([np.minimum(lu, lv) for _, (lu, lv) in layers])
+    v = np.concatenate([np.maximum(lu, lv) for _, (lu, lv) in layers])
+    etype = np.concatenate([np.full(len(lu), EDGE_TYPE_CODES[edge_type], dtype=np.uint8)
+                            for edge_type, (lu, _) in layers])
 
+    # the first edge of every pair is kept, which keeps layer order
+    keep, clashes = dedup_edges(u, v, etype, num_nodes)
+    print(f"[Graph] Edge-add clashes: {len(u) - len(keep)}")
+
+    u, v, etype = u[keep], v[keep], etype[keep]
+    params = {'TP': [], 'CI': [], 'CP': []}
+    for edge_type, _ in layers:
+        layer_params = generate_edge_params_batch(edge_type, int(np.count_nonzero(etype == EDGE_TYPE_CODES[edge_type])), params_rng)
+        for name, values in layer_params.items():
+            params[name].append(values)
+
+    table = EdgeTable(num_nodes, u, v, etype,
+                      np.concatenate(params['TP']), np.concatenate(params['CI']), np.concatenate(params['CP']))
+    print("[Graph] Building CSR adjacency...")
+    graph = CSRGraph.from_edge_table(table)
+    graph.clashes = clashes
+    return graph
+
+
+
+
+def load_or_generate_graph(cache: ArtifactCache, seed, workers=1, **params):
+    """
+    generate_graph through an ArtifactCache: the graph built from the same parameters, seed and code version
+    is loaded (memory-mapped) instead of generated again. params are the keyword arguments of generate_graph.
+    """
+    def build(seed, **build_params):
+        return generate_graph(**build_params, seed=seed, workers=workers)
 
+    code_version = source_version(sys.modules[__name__], graph_arrays, graph_stats, random_streams)
+    return cache.get_or_build("csr_graph", params, seed, code_version, build, save_graph, load_graph)
 
 
 # Example usage:
@@ -224,7 +466,6 @@ if __name__ == "__main__":
                        seed=None)
 
     print(time.time() - a)
-    with open('rs_graph.gpickle', 'wb') as f:
-        pickle.dump(G, f, pickle.HIGHEST_PROTOCOL)
+    save_graph('rs_graph', G)
 
 
@@ -1,25 +1,64 @@
-import random
+import numpy as np
 
+from group_membership import GroupMembership
 
-def generate_work_communities(
+
+def draw_community_sizes(num_nodes: int, min_size: int, max_size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draws uniform community sizes in [min_size, max_size] for num_nodes nodes, in one call.
+    A tail of at least min_size nodes becomes a community of its own, a smaller tail joins the last community
+    if it stays within max_size and is left without a community otherwise.
+    """
+    if num_nodes == 0 or num_nodes < min_size:
+        return np.zeros(0, dtype=np.int64)
+
+    sizes = np.zeros(0, dtype=np.int64)
+    while sizes.sum() < num_nodes:
+        count = (num_nodes - int(sizes.sum())) // max(min_size, 1) + 1
+        sizes = np.concatenate([sizes, rng.integers(min_size, max_size + 1, size=count)])
+
+    ends = np.cumsum(sizes)
+    num_full = int(np.searchsorted(ends, num_nodes, side="right"))
+    sizes = sizes[:num_full].copy()
+    tail = num_nodes - (int(ends[num_full - 1]) if num_full else 0)
+    if tail >= min_size and tail > 0:
+        sizes = np.append(sizes, tail)
+    elif tail > 0 and num_full and sizes[-1] + tail <= max_size:
+        sizes[-1] += tail
+    return sizes
+
+
+def _partition(node_ids: np.ndarray, num_nodes: int, min_size: int, max_size: int,
+               rng: np.random.Generator) -> GroupMembership:
+    """
+    Partitions node_ids (positions in [0, num_nodes)) into communities, returns them over [0, num_nodes)
+    """
+    sizes = draw_community_sizes(len(node_ids), min_size, max_size, rng)
+    labels = np.full(num_nodes, -1, dtype=np.int32)
+    labels[node_ids[rng.permutation(len(node_ids))[:int(sizes.sum())]]] = np.repeat(
+        np.arange(len(sizes), dtype=np.int32), sizes)
+    return GroupMembership.from_labels(labels, len(sizes))
+
+
+def partition_communities(
         node_range: tuple[int, int],
         min_size: int,
-        max_size: int
-) -> tuple[list[list[int]], dict[int, int]]:
+        max_size: int,
+        rng=None
+) -> GroupMembership:
     """
-    Divides node IDs within a given range into distinct communities.
-    Each node ID belongs to at most one community.
-    Communities adhere to min_size and max_size.
+    Divides node IDs within a given range into communities, vectorized: all community sizes are drawn at once
+    (see draw_community_sizes) and consecutive slices of a permutation of the range become the communities.
+    Members of every community are in ascending order.
 
     Args:
         node_range (tuple[int, int]): Inclusive (start_id, end_id) of node IDs.
         min_size (int): Minimum size of a community.
         max_size (int): Maximum size of a community.
+        rng: numpy Generator (or seed) the permutation and community sizes are drawn from, None for fresh entropy.
 
     Returns:
-        tuple[list[list[int]], dict[int, int]]:
-            - A list of communities (each community is a list of node IDs).
-            - A dictionary mapping node_ids to their community_id (index in the communities list).
+        GroupMembership: the communities, every node ID is in at most one of them.
     """
     start_id, end_id = node_range
     if not (0 <= min_size):
@@ -27,51 +66,83 @@ def generate_work_communities(
     if not (min_size <= max_size):
         raise ValueError("min_size cannot be greater than max_size.")
     if start_id > end_id:
-        # Or raise ValueError("start_id in node_range cannot be greater than end_id.")
-        return [], {}
-
-    num_nodes_in_range = end_id - start_id + 1
-    if num_nodes_in_range == 0 or num_nodes_in_range < min_size:
-        return [], {}
-
-    available_node_ids = list(range(start_id, end_id + 1))
-    random.shuffle(available_node_ids)
-
-    communities: list[list[int]] = []
-    community_index: dict[int, int] = {}
-
-    current_node_list_idx = 0  # Index for iterating through shuffled available_node_ids
-
-    while current_node_list_idx < num_nodes_in_range:
-        remaining_nodes_count = num_nodes_in_range - current_node_list_idx
-        if remaining_nodes_count < min_size:
-            break
-
-        possible_max_for_this_community = min(max_size, remaining_nodes_count)
-        community_size = random.randint(min_size, possible_max_for_this_community)
-
-        nodes_left_after_this_community = remaining_nodes_count - community_size
-        if 0 < nodes_left_after_this_community < min_size:
-            potential_new_size = community_size + nodes_left_after_this_community
-            if potential_new_size <= max_size:
-                community_size = potential_new_size
-
-        new_community_members: list[int] = []
-        for _ in range(community_size):
-            if current_node_list_idx < num_nodes_in_range:
-                new_community_members.append(available_node_ids[current_node_list_idx])
-                current_node_list_idx += 1
-            else:
-                break
-
-        if min_size <= len(new_community_members) <= max_size:
-            community_id = len(communities)
-            sorted_community = sorted(new_community_members)  # Sort for consistent output/order
-            communities.append(sorted_community)
-            for node_id in sorted_community:  # or new_community_members if order doesn't matter for index
-                community_index[node_id] = community_id
-        # else: This chunk of nodes couldn't form a valid community (should be rare with current logic)
+        return GroupMembership.empty()
 
+    rng = np.random.default_rng(rng)
+    num_nodes = end_id - start_id + 1
+    return _partition(np.arange(num_nodes), num_nodes, min_size, max_size, rng).offset(start_id)
+
+
+def partition_side_communities(
+        node_range: tuple[int, int],
+        side_sizes: tuple[int, int],
+        side_share: float = 1.0,
+        rng=None
+) -> GroupMembership:
+    """
+    Side communities (e.g. a second job or a club) of a range: a random side_share of the node IDs is partitioned
+    into communities of side_sizes (min_size, max_size) like partition_communities does.
+    Every node ID is in at most one side community, on top of its plain community.
+    """
+    start_id, end_id = node_range
+    if side_sizes[0] > side_sizes[1]:
+        raise ValueError("min_size cannot be greater than max_size.")
+    if start_id > end_id:
+        return GroupMembership.empty()
+
+    rng = np.random.default_rng(rng)
+    num_nodes = end_id - start_id + 1
+    side_members = rng.permutation(num_nodes)[:int(round(side_share * num_nodes))]
+    return _partition(side_members, num_nodes, *side_sizes, rng).offset(start_id)
+
+
+def generate_profession_communities(
+        profession_ranges: dict[str, tuple[int, int]],
+        community_sizes: dict[str, tuple[int, int]],
+        rng=None,
+        side_sizes: tuple[int, int] | None = None,
+        side_share: float = 1.0
+) -> tuple[GroupMembership, GroupMembership]:
+    """
+    Work communities of every profession group listed in community_sizes ((min_size, max_size) per group),
+    in one call. Groups not listed get no communities, community ids follow the order of community_sizes.
+    With side_sizes, a side_share of every listed group also gets side communities (see partition_side_communities).
+
+    returns (communities, side_communities), side_communities is empty without side_sizes
+    """
+    rng = np.random.default_rng(rng)
+    communities = GroupMembership.empty()
+    side_communities = GroupMembership.empty()
+    for profession_group, (min_size, max_size) in community_sizes.items():
+        communities = communities.concatenate(
+            partition_communities(profession_ranges[profession_group], min_size, max_size, rng))
+    # drawn after all plain communities, so those don't depend on the side options
+    if side_sizes is not None:
+        for profession_group in community_sizes:
+            side_communities = side_communities.concatenate(
+                partition_side_communities(profession_ranges[profession_group], side_sizes, side_share, rng))
+    return communities, side_communities
+
+
+def generate_work_communities(
+        node_range: tuple[int, int],
+        min_size: int,
+        max_size: int,
+        rng=None
+) -> tuple[list[list[int]], dict[int, int]]:
+    """
+    Divides node IDs within a given range into distinct communities (see partition_communities).
+    Each node ID belongs to at most one community.
+    Communities adhere to min_size and max_size.
+
+    Returns:
+        tuple[list[list[int]], dict[int, int]]:
+            - A list of communities (each community is a list of node IDs).
+            - A dictionary mapping node_ids to their community_id (index in the communities list).
+    """
+    communities = [community.tolist() for community in partition_communities(node_range, min_size, max_size, rng)]
+    community_index = {node_id: community_id
+                       for community_id, community in enumerate(communities) for node_id in community}
     return communities, community_index
 
 
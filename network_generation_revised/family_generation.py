@@ -1,63 +1,51 @@
+import numpy as np
 
-def generate_families(age_group_to_node_range):
+from group_membership import GroupMembership
+
+
+def generate_families(age_group_to_node_range, family_size=10):
 
     """
-    generate families for 100k nodes, with age_groups pre-defined
-    puts 1 baby
+    generate families for the population covered by age_group_to_node_range (node ids [0, num_nodes))
+    num_nodes // family_size families are made and every age group is spread evenly over them,
+    for the 100k population with family_size=10 that puts
+    1 baby
     2 kids
     2 young adults
     3/4 adults
     1/2 olds
     in each family
-    family_size=10
+
+    Nodes are handed out in id order. Family f gets the nodes of age group g that fall between
+    ceil(f * S_g / F) and ceil(f * S_(g+1) / F) in the concatenated age groups (S_g being the number of
+    nodes in the groups before g, F the number of families), so that the uneven age groups compensate
+    each other and families stay at family_size whenever num_nodes is a multiple of it.
 
     returns families, family_index
     family_index[i] gives family_id of node_id i
-    families[i] gives the family with family_id of i
-    family is a list of nodes that are in one family
+    families[i] gives the family with family_id of i (see GroupMembership)
+    family is the node ids that are in one family
 
     """
-    NUM_NODES = 100_000
-    FAMILY_SIZE = 10
-    NUM_FAMILIES = NUM_NODES//FAMILY_SIZE
-
-    # pointers to keep track of nodes that have already been made part of a family
-    babies = 0
-    kids = 0
-    young_adults = 0
-    adults =0
-    olds = 0
-
-    families = []
-
-    # family_index[i] gives the family_index of the ith node
-    family_index = {}
-
-    for i in range(NUM_FAMILIES):
-
-        family = []
-        for _ in range(1):
-            family.append(age_group_to_node_range["baby"][0] + babies)
-            babies+=1
-        for _ in range(2):
-            family.append(age_group_to_node_range["kid"][0] + kids)
-            kids += 1
-        for _ in range(2):
-            family.append(age_group_to_node_range["young_adult"][0] + young_adults)
-            young_adults += 1
-        for _ in range(4 if i%2==0 else 3):
-            family.append(age_group_to_node_range["adult"][0] + adults)
-            adults+=1
-        for _ in range(1 if i%2==0 else 2):
-            family.append(age_group_to_node_range["old"][0] + olds)
-            olds += 1
-
-        for node_id in family:
-            family_index[node_id] = i
-
-        families.append(family)
 
-    return families, family_index
+    age_ranges = sorted(age_group_to_node_range.values())
+    num_nodes = age_ranges[-1][1] + 1
+    num_families = max(num_nodes // family_size, 1)
+
+    family_index = np.full(num_nodes, -1, dtype=np.int32)
 
+    family_ids = np.arange(num_families + 1, dtype=np.int64)
+    nodes_before = 0
+    for start, end in age_ranges:
+        group_size = end - start + 1
+        # ceil(f * S / F) for every f, with integers so that the bounds are exact
+        lower = -(-family_ids * nodes_before // num_families)
+        upper = -(-family_ids * (nodes_before + group_size) // num_families)
+        # offsets into the age group where each family starts, forced monotone for very small age groups
+        offsets = np.minimum(np.maximum.accumulate(upper - lower), group_size)
+        family_index[start:end + 1] = np.repeat(family_ids[:-1], np.diff(offsets))
+        nodes_before += group_size
 
+    families = GroupMembership.from_labels(family_index, num_families)
 
+    return families, family_index
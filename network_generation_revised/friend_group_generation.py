@@ -1,6 +1,17 @@
-import random
 import time
 
+import numpy as np
+
+from random_streams import python_random
+
+
+DISTRIBUTION_TARGETS = {
+    1: 0.10,  # 10% of people in 1 group
+    2: 0.20,  # 20% of people in 2 groups
+    3: 0.40,  # 40% of people in 3 groups
+    4: 0.20,  # 20% of people in 4 groups
+    5: 0.10,  # 10% of people in 5 groups
+}
 
 
 def get_family_member(person_id):
@@ -23,12 +34,20 @@ def get_family_member(person_id):
 
 
 
-def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=100, max_group_size=5):
+def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=100, max_group_size=5,
+                           mode="incremental", rng=None):
     """
     Main function to assign people to friend groups based on the guidelines.
 
     - node_range is the inclusive range of node_ids we're assigning into friend_groups
     - pref_strength is the probability that two people with same target num_friend groups end up in the same friend group
+    - candidate_sample_size is the number of candidates considered per group (only used by mode "scan")
+    - mode selects the engine:
+        "incremental" keeps the people still needing groups in pools that are updated as members are placed,
+                      so every group costs O(max_group_size) and the whole run is linear in the population.
+        "scan" is the original engine that rescans every person for each new group (quadratic).
+        "vectorized" forms all groups in NumPy batches, see _generate_friend_groups_vectorized.
+    - rng is the numpy Generator (or seed) all randomness is drawn from, None for fresh entropy
 
     Maximum Group Size: The size of each friend group must be at MOST 5 people.
     Membership Distribution: The people (nodes) should be distributed across a certain number of friend groups according to these percentages:
@@ -50,20 +69,28 @@ def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=
 
     """
 
-    DISTRIBUTION_TARGETS = {
-        1: 0.10,  # 10% of people in 1 group
-        2: 0.20,  # 20% of people in 2 groups
-        3: 0.40,  # 40% of people in 3 groups
-        4: 0.20,  # 20% of people in 4 groups
-        5: 0.10,  # 10% of people in 5 groups
-    }
+    rng = np.random.default_rng(rng)
+    if mode == "incremental":
+        return _generate_friend_groups_incremental(node_range, pref_strength, max_group_size, python_random(rng))
+    if mode == "scan":
+        return _generate_friend_groups_scan(node_range, pref_strength, candidate_sample_size, max_group_size,
+                                            python_random(rng))
+    if mode == "vectorized":
+        return _generate_friend_groups_vectorized(node_range, pref_strength, max_group_size, rng)
+    raise ValueError(f"Unknown friend group generation mode: {mode!r}")
+
 
+def _assign_targets(node_range, py_random):
+    """
+    Shuffles the node_range and hands out the target number of friend groups according to DISTRIBUTION_TARGETS.
+
+    returns a dict mapping person_id -> target number of friend groups
+    """
 
     person_ids_initial = list(range(node_range[0], node_range[1]+1))
-    random.shuffle(person_ids_initial)  # Shuffle for random assignment of target group counts
+    py_random.shuffle(person_ids_initial)  # Shuffle for random assignment of target group counts
 
-    person_data = {}
-    # Structure: { person_id: {'target': int, 'current': int, 'groups': list_of_group_ids} }
+    targets = {}
 
     # Assign target number of groups to each person
     current_idx = 0
@@ -71,24 +98,314 @@ def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=
         num_in_category = int(len(person_ids_initial) * percentage)
         for _ in range(num_in_category):
             if current_idx < len(person_ids_initial):
-                person = person_ids_initial[current_idx]
-                person_data[person] = {'target': target_count, 'current': 0, 'groups': []}
+                targets[person_ids_initial[current_idx]] = target_count
                 current_idx += 1
 
     # Distribute any remaining people due to rounding (should be few or none)
     # Assign them to the most common target category (3 groups) or any other default.
     default_target_for_remainder = 3
     while current_idx < len(person_ids_initial):
-        person = person_ids_initial[current_idx]
-        person_data[person] = {'target': default_target_for_remainder, 'current': 0, 'groups': []}
+        targets[person_ids_initial[current_idx]] = default_target_for_remainder
         current_idx += 1
 
+    return targets
+
+
+class IndexedPool:
+    """
+    A set of ids backed by an array, supporting O(1) add, remove and uniform random sampling.
+    Removal swaps the removed id with the last one in the array, so positions have to be tracked.
+    """
+
+    def __init__(self):
+        self.items: list[int] = []
+        self.position: dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __contains__(self, item):
+        return item in self.position
+
+    def add(self, item):
+        self.position[item] = len(self.items)
+        self.items.append(item)
+
+    def remove(self, item):
+        index = self.position.pop(item)
+        last = self.items.pop()
+        if last != item:
+            self.items[index] = last
+            self.position[last] = index
+
+    def sample(self, py_random):
+        return self.items[py_random.randrange(len(self.items))]
+
+
+def _draw_eligible(pools, blocked, py_random):
+    """
+    Draws a uniformly random id from the union of pools that is not in blocked, or None if there is none.
+
+    blocked only ever holds the members of the group being built and their family members (at most
+    2 * max_group_size ids), so once the pools are bigger than twice that, rejection sampling needs
+    fewer than two draws on average. Smaller pools are scanned directly.
+    """
+
+    total = sum(len(pool) for pool in pools)
+    if total == 0:
+        return None
+
+    if total <= 2 * len(blocked):
+        eligible = [p for pool in pools for p in pool.items if p not in blocked]
+        return py_random.choice(eligible) if eligible else None
+
+    while True:
+        index = py_random.randrange(total)
+        for pool in pools:
+            if index < len(pool):
+                candidate = pool[index]
+                break
+            index -= len(pool)
+        if candidate not in blocked:
+            return candidate
+
+
+def _generate_friend_groups_incremental(node_range, pref_strength, max_group_size, py_random):
+    """
+    Work-queue engine for generate_friend_groups.
+
+    People still needing groups are kept in one IndexedPool per target category, which doubles as the
+    like-minded bucket. A person is removed from their pool as soon as their target is met, so nobody
+    is ever rescanned and each group costs O(max_group_size) draws.
+    """
+
+    targets = _assign_targets(node_range, py_random)
+
+    remaining = dict(targets)
+    groups_of_person = {person: [] for person in targets}
+
+    pools = {target_count: IndexedPool() for target_count in DISTRIBUTION_TARGETS}
+    for person, target_count in targets.items():
+        pools[target_count].add(person)
+    all_pools = list(pools.values())
+
+    friend_groups = []
+
+    while True:
+        seed_person = _draw_eligible(all_pools, (), py_random)
+        if seed_person is None:
+            break  # All assignments are met
+
+        new_group = [seed_person]
+        # members of the group and their family members, none of whom can join the group
+        blocked = {seed_person, get_family_member(seed_person)}
+
+        seed_target_category = targets[seed_person]
+        like_minded_pools = [pools[seed_target_category]]
+        other_pools = [pool for target_count, pool in pools.items() if target_count != seed_target_category]
+
+        for _ in range(max_group_size - 1):
+            if py_random.random() < pref_strength:  # Try preferred pool first
+                chosen_candidate = _draw_eligible(like_minded_pools, blocked, py_random)
+                if chosen_candidate is None:  # Fallback to other pool
+                    chosen_candidate = _draw_eligible(other_pools, blocked, py_random)
+            else:  # Try other pool first
+                chosen_candidate = _draw_eligible(other_pools, blocked, py_random)
+                if chosen_candidate is None:  # Fallback to preferred pool
+                    chosen_candidate = _draw_eligible(like_minded_pools, blocked, py_random)
+
+            if chosen_candidate is None:
+                break  # Nobody left who can join this group
+
+            new_group.append(chosen_candidate)
+            blocked.add(chosen_candidate)
+            blocked.add(get_family_member(chosen_candidate))
+
+        current_group_id = len(friend_groups)
+        friend_groups.append(new_group)
+        for member in new_group:
+            groups_of_person[member].append(current_group_id)
+            remaining[member] -= 1
+            if remaining[member] == 0:
+                pools[targets[member]].remove(member)
+
+    return friend_groups, groups_of_person
+
+
+def _assign_targets_array(num_people, rng):
+    """
+    Array version of _assign_targets.
+
+    returns targets where targets[i] is the target number of friend groups of the i-th person in the node range
+    """
+
+    shuffled = rng.permutation(num_people)
+    targets = np.full(num_people, 3, dtype=np.int8)  # remainder due to rounding goes to the 3 groups category
+
+    current_idx = 0
+    for target_count, percentage in DISTRIBUTION_TARGETS.items():
+        num_in_category = int(num_people * percentage)
+        targets[shuffled[current_idx:current_idx + num_in_category]] = target_count
+        current_idx += num_in_category
+
+    return targets
+
+
+def _generate_friend_groups_vectorized(node_range, pref_strength, max_group_size, rng):
+    """
+    Batch engine for generate_friend_groups.
+
+    Every person is expanded into target "slots" (one per friend group they need). With probability
+    pref_strength a slot keeps its own target category as sort key, otherwise it gets a random category,
+    and slots are sorted by key (randomly within a key) so that like-minded people mostly land next to each other.
+    Consecutive runs of max_group_size slots then form groups.
+
+    A slot is rejected if an earlier slot of its group holds the same person or their family member
+    (get_family_member, i.e. id ^ 1). Rejected slots are grouped again among themselves in the next round,
+    the first slot of a group is always accepted so every round makes progress.
+    """
+
+    people = np.arange(node_range[0], node_range[1] + 1, dtype=np.int64)
+    if len(people) == 0:
+        return [], {}
+    targets = _assign_targets_array(len(people), rng)
+    categories = np.array(list(DISTRIBUTION_TARGETS.keys()), dtype=np.int8)
+
+    pending_people = np.repeat(people, targets)
+    pending_keys = np.repeat(targets, targets)
+    mixing = rng.random(len(pending_keys)) >= pref_strength
+    pending_keys[mixing] = rng.choice(categories, size=int(mixing.sum()))
+
+    group_members = []  # flat member ids of accepted groups, in group order
+    group_sizes = []
+    num_groups = 0
+
+    while len(pending_people):
+        order = np.lexsort((rng.random(len(pending_people)), pending_keys))
+        pending_people = pending_people[order]
+        pending_keys = pending_keys[order]
+
+        num_rows = -(-len(pending_people) // max_group_size)
+        padded = np.full(num_rows * max_group_size, -1, dtype=np.int64)
+        padded[:len(pending_people)] = pending_people
+        slots = padded.reshape(num_rows, max_group_size)
+
+        valid = slots >= 0
+        rejected = np.zeros_like(valid)
+        for j in range(1, max_group_size):
+            for k in range(j):
+                kept_k = valid[:, k] & ~rejected[:, k]
+                # slots[:, k] ^ 1 is get_family_member of every slot in column k
+                clash = (slots[:, j] == slots[:, k]) | (slots[:, j] == (slots[:, k] ^ 1))
+                rejected[:, j] |= valid[:, j] & kept_k & clash
+
+        accepted = valid & ~rejected
+        sizes = accepted.sum(axis=1)
+        group_members.append(slots[accepted])
+        group_sizes.append(sizes[sizes > 0])
+        num_groups += int((sizes > 0).sum())
+
+        rejected_flat = rejected.ravel()[:len(pending_people)]
+        pending_people = pending_people[rejected_flat]
+        pending_keys = pending_keys[rejected_flat]
+
+    members = np.concatenate(group_members)
+    sizes = np.concatenate(group_sizes)
+    member_group_ids = np.repeat(np.arange(num_groups), sizes)
+
+    bounds = np.cumsum(sizes).tolist()
+    members_list = members.tolist()
+    friend_groups = [members_list[start:end] for start, end in zip([0] + bounds[:-1], bounds)]
+
+    by_person = np.lexsort((member_group_ids, members))
+    person_ids = members[by_person].tolist()
+    person_group_ids = member_group_ids[by_person].tolist()
+    person_data = {person: [] for person in people.tolist()}
+    for person, group_id in zip(person_ids, person_group_ids):
+        person_data[person].append(group_id)
+
+    return friend_groups, person_data
+
+
+def friend_group_statistics(friend_groups, person_data):
+    """
+    Summary statistics used to compare the engines of generate_friend_groups.
+
+    returns a dict with
+        "membership": fraction of people in 1..5 friend groups
+        "family_violations": number of groups holding two members of the same family
+        "like_minded": fraction of member pairs that share the same number of friend groups
+        "mean_group_size": average friend group size
+    """
+
+    membership_counts = np.bincount([len(groups) for groups in person_data.values()],
+                                    minlength=max(DISTRIBUTION_TARGETS) + 1)
+    membership = {target_count: float(membership_counts[target_count] / len(person_data))
+                  for target_count in DISTRIBUTION_TARGETS}
+
+    family_violations = 0
+    like_minded_pairs = 0
+    total_pairs = 0
+    for group in friend_groups:
+        members = set(group)
+        if any(get_family_member(member) in members for member in group):
+            family_violations += 1
+        for i in range(len(group)):
+            for j in range(i + 1, len(group)):
+                total_pairs += 1
+                like_minded_pairs += len(person_data[group[i]]) == len(person_data[group[j]])
+
+    return {
+        "membership": membership,
+        "family_violations": family_violations,
+        "like_minded": like_minded_pairs / total_pairs if total_pairs else 0.0,
+        "mean_group_size": sum(len(group) for group in friend_groups) / len(friend_groups),
+    }
+
+
+def check_vectorized_against_scan(node_range, tolerance=0.02, rng=None, **kwargs):
+    """
+    Statistical check that mode "vectorized" reproduces the membership histogram and the family constraint
+    of the original "scan" engine on the same node_range.
+    Membership fractions must agree within tolerance and neither engine may violate the family constraint.
+
+    returns (passed, stats) where stats maps mode to its friend_group_statistics
+    """
+
+    rng = np.random.default_rng(rng)
+    stats = {}
+    for mode in ("scan", "vectorized"):
+        friend_groups, person_data = generate_friend_groups(node_range, mode=mode, rng=rng, **kwargs)
+        stats[mode] = friend_group_statistics(friend_groups, person_data)
+
+    passed = all(stats[mode]["family_violations"] == 0 for mode in stats) and all(
+        abs(stats["scan"]["membership"][t] - stats["vectorized"]["membership"][t]) <= tolerance
+        for t in DISTRIBUTION_TARGETS
+    )
+    return passed, stats
+
+
+def _generate_friend_groups_scan(node_range, pref_strength, candidate_sample_size, max_group_size, py_random):
+    """
+    Original engine for generate_friend_groups, rescans every person for each new group.
+    """
+
+    num_people = node_range[1] - node_range[0] + 1
+
+    person_data = {}
+    # Structure: { person_id: {'target': int, 'current': int, 'groups': list_of_group_ids} }
+    for person, target_count in _assign_targets(node_range, py_random).items():
+        person_data[person] = {'target': target_count, 'current': 0, 'groups': []}
+
     friend_groups = []
     group_id_counter = 0
 
     # Main loop: continue as long as someone needs to be in more groups
     # Iteration guard to prevent potential infinite loops if constraints are impossible
-    max_iterations = len(person_ids_initial) * sum(DISTRIBUTION_TARGETS.keys())  # Generous upper bound
+    max_iterations = num_people * sum(DISTRIBUTION_TARGETS.keys())  # Generous upper bound
     iterations_done = 0
 
     while any(p_data['current'] < p_data['target'] for p_data in person_data.values()):
@@ -105,7 +422,7 @@ def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=
         if not people_still_needing_groups:
             break  # All assignments are met
 
-        random.shuffle(people_still_needing_groups)
+        py_random.shuffle(people_still_needing_groups)
         seed_person = people_still_needing_groups[0]
 
         # Start a new group with the seed person
@@ -123,7 +440,7 @@ def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=
 
         # Sample from this pool to keep candidate checking performant
         actual_sample_size = min(len(potential_add_pool), candidate_sample_size)
-        candidate_sample_for_group = random.sample(potential_add_pool, actual_sample_size)
+        candidate_sample_for_group = py_random.sample(potential_add_pool, actual_sample_size)
 
         # Try to add more members to the current group
         for _ in range(max_group_size - 1):  # Max members to add = MAX_GROUP_SIZE - 1 (seed)
@@ -156,10 +473,10 @@ def generate_friend_groups(node_range, pref_strength=0.7, candidate_sample_size=
                                     person_data[p]['target'] == seed_target_category]
             other_eligible = [p for p in eligible_for_this_slot if person_data[p]['target'] != seed_target_category]
 
-            random.shuffle(like_minded_eligible)  # Randomness within preference
-            random.shuffle(other_eligible)
+            py_random.shuffle(like_minded_eligible)  # Randomness within preference
+            py_random.shuffle(other_eligible)
 
-            if random.random() < pref_strength:  # Try preferred pool first
+            if py_random.random() < pref_strength:  # Try preferred pool first
                 if like_minded_eligible:
                     chosen_candidate = like_minded_eligible[0]
                 elif other_eligible:  # Fallback to other pool
@@ -210,11 +527,16 @@ if __name__ == "__main__":
 
     start_time = time.time()
 
-    final_friend_groups, final_person_data = generate_friend_groups()
+    final_friend_groups, final_person_data = generate_friend_groups((10_000, 30_000 - 1))
 
     end_time = time.time()
     print(f"\nGenerated {len(final_friend_groups)} friend groups in {end_time - start_time:.2f} seconds.")
 
+    passed, mode_stats = check_vectorized_against_scan((10_000, 15_000 - 1))
+    for mode_name, mode_stat in mode_stats.items():
+        print(mode_name, mode_stat)
+    print("vectorized matches scan" if passed else "vectorized DOES NOT match scan")
+
 
 
 
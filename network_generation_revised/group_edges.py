@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+
+from group_membership import GroupMembership, expand_ranges, sort_pairs
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from graph_arrays import EDGE_TYPE_CODES
+
+"""
+
+Expansion of groups (families, friend groups, communities) into the edges between their members:
+every group is a clique, the edge list of a layer is the union of the cliques of its groups.
+
+"""
+
+# upper bound on the number of edges expanded at once (a single node with more edges is expanded alone)
+DEFAULT_CHUNK_EDGES = 1 << 22
+
+
+def iter_clique_edges(groups: GroupMembership, num_nodes: int, chunk_edges: int = DEFAULT_CHUNK_EDGES):
+    """
+    Yields the edges (u, v) between members of the same group, as int32 arrays with u < v, in chunks of
+    consecutive u ranges. A pair is only yielded once, whatever the number of groups it shares.
+
+    With the members of every group in ascending order, the entry of u at position i of a group of size s
+    has the s - 1 - i members after it as neighbours (the rows of the upper triangle of the group's clique).
+    Entries are visited in node order, so every chunk holds all the edges of its nodes and duplicates can be
+    dropped chunk by chunk. A chunk holds at most about chunk_edges edges before deduplication.
+    """
+    groups = groups.sort_members(num_nodes)
+    entry_end = np.repeat(groups.indptr[1:], groups.sizes())
+    num_after = entry_end - np.arange(len(groups.indices), dtype=np.int64) - 1
+
+    # entries sorted by node, the entries of node n are entry_order[node_indptr[n]:node_indptr[n + 1]]
+    entry_order = sort_pairs(groups.indices, np.arange(len(groups.indices), dtype=np.int64), len(groups.indices))
+    node_indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups.indices, minlength=num_nodes), out=node_indptr[1:])
+    # edges_before[n]: number of (u, v) pairs with u < n, counting duplicates
+    edges_before = np.zeros(len(entry_order) + 1, dtype=np.int64)
+    np.cumsum(num_after[entry_order], out=edges_before[1:])
+    edges_before = edges_before[node_indptr]
+
+    start = 0
+    while start < num_nodes:
+        end = int(np.searchsorted(edges_before, edges_before[start] + chunk_edges, side="right")) - 1
+        end = min(max(end, start + 1), num_nodes)
+        entries = entry_order[node_indptr[start]:node_indptr[end]]
+        neighbors = expand_ranges(entries + 1, entry_end[entries])
+        if len(neighbors):
+            u = np.repeat(groups.indices[entries], num_after[entries]).astype(np.int64)
+            v = groups.indices[neighbors]
+            distinct = u != v
+            keys = u[distinct] * num_nodes + v[distinct]
+            keys.sort()
+            keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+            yield (keys // num_nodes).astype(np.int32), (keys % num_nodes).astype(np.int32)
+        start = end
+
+
+def iter_group_edges(layers: dict[str, GroupMembership], num_nodes: int, chunk_edges: int = DEFAULT_CHUNK_EDGES):
+    """
+    Yields the edges of every layer (edge type -> groups, see Network.layers) as (u, v, etype) chunks,
+    etype being the uint8 code of the layer's edge type (graph_arrays.EDGE_TYPE_CODES).
+    Only one chunk is in memory at a time, so populations of any size can be exported.
+    """
+    for edge_type, groups in layers.items():
+        code = EDGE_TYPE_CODES[edge_type]
+        for u, v in iter_clique_edges(groups, num_nodes, chunk_edges):
+            yield u, v, np.full(len(u), code, dtype=np.uint8)
+
+
+def group_edges(layers: dict[str, GroupMembership], num_nodes: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    returns (u, v, etype): every edge of every layer once per edge type, with u < v (see iter_group_edges)
+    """
+    chunks = list(iter_group_edges(layers, num_nodes))
+    if not chunks:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint8)
+    return tuple(np.concatenate(columns) for columns in zip(*chunks))
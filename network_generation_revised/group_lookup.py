@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class RangeLookup:
+    """
+    Maps node ids to the group whose inclusive node range contains them, e.g. age_group_to_node_range.
+
+    Groups are numbered by their position in the range dict (names[code] is the group name),
+    NO_GROUP is the code of node ids outside every range.
+    A dense uint8 table gives the code of every node id below num_nodes in O(1),
+    node ids beyond the table fall back to np.searchsorted over the range boundaries.
+    """
+
+    NO_GROUP = 255
+
+    def __init__(self, group_to_node_range: dict[str, tuple[int, int]], num_nodes: int | None = None,
+                 table: np.ndarray | None = None):
+        if len(group_to_node_range) >= self.NO_GROUP:
+            raise ValueError(f"at most {self.NO_GROUP - 1} groups fit in a uint8 code")
+
+        self.names: list[str] = list(group_to_node_range.keys())
+        ranges = np.array(list(group_to_node_range.values()), dtype=np.int64).reshape(-1, 2)
+
+        order = np.argsort(ranges[:, 0], kind="stable")
+        self._starts = ranges[order, 0]
+        self._ends = ranges[order, 1]
+        self._codes_by_start = order.astype(np.uint8)
+        if np.any(self._starts[1:] <= self._ends[:-1]):
+            raise ValueError("node ranges must not overlap")
+
+        if table is not None:
+            # a table saved earlier for the same ranges
+            self.table: np.ndarray = table
+            return
+        if num_nodes is None:
+            num_nodes = int(self._ends.max()) + 1 if len(ranges) else 0
+        self.table: np.ndarray = self._search(np.arange(num_nodes))
+
+    def _search(self, node_ids: np.ndarray) -> np.ndarray:
+        node_ids = np.asarray(node_ids)
+        if not len(self._starts):
+            return np.full(node_ids.shape, self.NO_GROUP, dtype=np.uint8)
+        position = np.maximum(np.searchsorted(self._starts, node_ids, side="right") - 1, 0)
+        inside = (self._starts[position] <= node_ids) & (node_ids <= self._ends[position])
+        return np.where(inside, self._codes_by_start[position], self.NO_GROUP).astype(np.uint8)
+
+    def codes(self, node_ids) -> np.ndarray:
+        """
+        returns the uint8 group code of every node id in node_ids
+        """
+        node_ids = np.asarray(node_ids)
+        if node_ids.size and 0 <= node_ids.min() and node_ids.max() < len(self.table):
+            return self.table[node_ids]
+        return self._search(node_ids)
+
+    def code(self, node_id: int) -> int:
+        if 0 <= node_id < len(self.table):
+            return int(self.table[node_id])
+        return int(self._search(node_id))
+
+    def group(self, node_id: int) -> str | None:
+        code = self.code(node_id)
+        return self.names[code] if code != self.NO_GROUP else None
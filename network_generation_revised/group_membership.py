@@ -0,0 +1,129 @@
+import numpy as np
+
+
+def sort_pairs(keys: np.ndarray, values: np.ndarray, num_values: int) -> np.ndarray:
+    """
+    returns values ordered by (key, value), with 0 <= values < num_values.
+    Sorting the pairs packed into one int64 is several times faster than a stable argsort of keys.
+    """
+    packed = keys.astype(np.int64) * max(num_values, 1) + values
+    packed.sort()
+    return packed % max(num_values, 1)
+
+
+def expand_ranges(starts: np.ndarray, ends: np.ndarray, segments: bool = False):
+    """
+    returns entries, the concatenation of arange(starts[i], ends[i]) for every i (e.g. the CSR entries of
+    a set of rows). With segments, returns (segment, entries, segment_starts): also the position i of every
+    entry's range and where each range starts in entries.
+    """
+    lengths = ends - starts
+    segment_starts = np.cumsum(lengths) - lengths
+    entries = np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(starts - segment_starts, lengths)
+    if not segments:
+        return entries
+    return np.repeat(np.arange(len(starts)), lengths), entries, segment_starts
+
+
+class GroupMembership:
+    """
+    Groups of node ids stored CSR-style, the members of group g are indices[indptr[g]:indptr[g+1]].
+
+    Behaves like the list of lists it replaces: len() is the number of groups, indexing a group
+    gives its members (as an array) and iterating goes over the groups in id order.
+    The same structure is used the other way around (node -> groups the node is in), see transpose.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        self.indptr: np.ndarray = indptr
+        self.indices: np.ndarray = indices
+
+    @classmethod
+    def empty(cls) -> "GroupMembership":
+        return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+
+    @classmethod
+    def from_groups(cls, groups) -> "GroupMembership":
+        """
+        Builds the CSR arrays from a list of groups (each group is a list of node ids).
+        """
+        sizes = np.fromiter((len(group) for group in groups), dtype=np.int64, count=len(groups))
+        indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=indptr[1:])
+        indices = np.fromiter((node_id for group in groups for node_id in group), dtype=np.int32, count=int(indptr[-1]))
+        return cls(indptr, indices)
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray, num_groups: int) -> "GroupMembership":
+        """
+        Builds groups from labels, where labels[node_id] is the group id of node_id or -1 if it is in no group.
+        Members of every group are in ascending node id order.
+        """
+        labels = np.asarray(labels)
+        node_ids = np.flatnonzero(labels >= 0)
+        group_ids = labels[node_ids]
+        indptr = np.zeros(num_groups + 1, dtype=np.int64)
+        np.cumsum(np.bincount(group_ids, minlength=num_groups), out=indptr[1:])
+        return cls(indptr, sort_pairs(group_ids, node_ids, len(labels)).astype(np.int32))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, group_id) -> np.ndarray:
+        if group_id < 0:
+            group_id += len(self)
+        if not 0 <= group_id < len(self):
+            raise IndexError(f"group id {group_id} out of range")
+        return self.indices[self.indptr[group_id]:self.indptr[group_id + 1]]
+
+    def __iter__(self):
+        for group_id in range(len(self)):
+            yield self.indices[self.indptr[group_id]:self.indptr[group_id + 1]]
+
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def group_ids(self) -> np.ndarray:
+        """
+        returns the group id of every entry in indices
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int32), self.sizes())
+
+    def offset(self, node_offset: int) -> "GroupMembership":
+        """
+        returns the same groups with node_offset added to every member
+        """
+        return GroupMembership(self.indptr, self.indices + np.int32(node_offset))
+
+    def concatenate(self, other: "GroupMembership") -> "GroupMembership":
+        """
+        returns self's groups followed by other's groups, group ids of other are shifted by len(self)
+        """
+        indptr = np.concatenate([self.indptr, other.indptr[1:] + self.indptr[-1]])
+        return GroupMembership(indptr, np.concatenate([self.indices, other.indices]))
+
+    def transpose(self, num_nodes: int) -> "GroupMembership":
+        """
+        returns the node -> groups view, its "group" i holds the ids of the groups node i is in (ascending)
+        """
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=num_nodes), out=indptr[1:])
+        return GroupMembership(indptr, sort_pairs(self.indices, self.group_ids(), len(self)).astype(np.int32))
+
+    def sort_members(self, num_nodes: int) -> "GroupMembership":
+        """
+        returns the same groups with the members of every group in ascending node id order
+        """
+        return GroupMembership(self.indptr, sort_pairs(self.group_ids(), self.indices, num_nodes).astype(np.int32))
+
+    def labels(self, num_nodes: int) -> np.ndarray:
+        """
+        returns labels where labels[node_id] is the (single) group node_id is in, -1 if it is in none
+        """
+        labels = np.full(num_nodes, -1, dtype=np.int32)
+        labels[self.indices] = self.group_ids()
+        return labels
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes
@@ -1,129 +1,398 @@
-import pickle
-
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import community_generation
+import family_generation
+import friend_group_generation
+import group_lookup
+import group_membership
+import random_streams
 from family_generation import generate_families
 from friend_group_generation import generate_friend_groups
-from community_generation import generate_work_communities
+from community_generation import generate_profession_communities
+from group_lookup import RangeLookup
+from group_membership import GroupMembership
+from random_streams import seed_sequence_from
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from artifact_cache import ArtifactCache, source_version
+import graph_arrays
+from graph_arrays import load_arrays, save_arrays
 """
 
-All sizes are fixed for a 100k size population.
-Variability can be introduced later if desired.
+The default population is 100k, the node ranges of age groups and professions are derived from shares
+so that other population sizes can be generated with generate_network(population=...).
 
 """
 
-"returns the inclusive node range allocated to the age group"
-age_group_to_node_range:dict[str, tuple[int, int]] = {
-    "baby" : (0,10_000-1),
-    "kid":(10_000, 30_000 - 1),
-    "young_adult":(30_000, 50_000 - 1),
-    "adult":(50_000, 85_000 - 1),
-    "old":(85_000, 100_000 - 1)
+DEFAULT_POPULATION = 100_000
+
+"share of the population in each age group, age groups get consecutive node ranges in this order"
+default_age_shares: dict[str, float] = {
+    "baby": 0.10,
+    "kid": 0.20,
+    "young_adult": 0.20,
+    "adult": 0.35,
+    "old": 0.15,
 }
 
-def get_age_group(node_id)->str|None:
-    for age_group in ["baby", "kid", "young_adult", "adult", "old"]:
-        node_range = age_group_to_node_range[age_group]
-        if node_id >= node_range[0] and node_id <= node_range[1]:
-            return age_group
-    return None
-
-profession_group_to_node_range: dict[str, tuple[int, int]] = {
-    "A": (50_000, 59_711),
-    "B": (59_712, 72_836),
-    "C": (72_837, 84_999)
+"share of the adults in each profession group"
+default_profession_shares: dict[str, float] = {
+    "A": 9_712 / 35_000,
+    "B": 13_125 / 35_000,
+    "C": 12_163 / 35_000,
 }
 
-# 2. Function to get profession group from a node_id
-def get_profession_group(node_id: int) -> str | None:
+"(min_size, max_size) of the work communities of each profession group, groups not listed get no communities"
+profession_community_sizes: dict[str, tuple[int, int]] = {
+    "A": (15, 30),
+    "B": (10, 20),
+}
 
+
+def shares_to_node_ranges(shares: dict[str, float], start: int, count: int) -> dict[str, tuple[int, int]]:
     """
-    Returns the profession group string for a given node_id.
-    Returns None if the node_id does not fall into any defined profession group range.
+    Splits the count node ids starting at start into consecutive inclusive ranges, one per key of shares,
+    sized in proportion to the shares (shares are normalized, so they don't have to sum to exactly 1).
+    """
+    weights = np.array(list(shares.values()), dtype=np.float64)
+    if np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError("shares must be non-negative and not all zero")
+    bounds = np.rint(np.cumsum(weights) / weights.sum() * count).astype(np.int64)
+    bounds[-1] = count
+    starts = np.concatenate([[0], bounds[:-1]])
+    return {name: (start + int(lo), start + int(hi) - 1) for name, lo, hi in zip(shares, starts, bounds)}
+
+
+def compute_node_ranges(population: int = DEFAULT_POPULATION,
+                        age_shares: dict[str, float] | None = None,
+                        profession_shares: dict[str, float] | None = None
+                        ) -> tuple[dict[str, tuple[int, int]], dict[str, tuple[int, int]]]:
     """
-    for profession_group, node_range in profession_group_to_node_range.items():
-        if node_range[0] <= node_id <= node_range[1]:
-            return profession_group
-    return None
+    returns age_group_to_node_range, profession_group_to_node_range for a population,
+    professions are assigned within the "adult" age group
+    """
+    age_ranges = shares_to_node_ranges(age_shares or default_age_shares, 0, population)
+    adult_start, adult_end = age_ranges["adult"]
+    profession_ranges = shares_to_node_ranges(profession_shares or default_profession_shares,
+                                              adult_start, adult_end - adult_start + 1)
+    return age_ranges, profession_ranges
 
 
-class Network:
-    def __init__(self, nodes, families, friend_groups, communities):
-        self.nodes:list[dict] = nodes
-        self.families:list[list] = families
-        self.friend_groups:list[list] = friend_groups
-        self.communities:list[list] = communities
+"returns the inclusive node range allocated to the age group (for the default population)"
+age_group_to_node_range: dict[str, tuple[int, int]]
+profession_group_to_node_range: dict[str, tuple[int, int]]
+age_group_to_node_range, profession_group_to_node_range = compute_node_ranges()
 
-    def get_age_group(self, node_id) -> str | None:
-        for age_group in ["baby", "kid", "young_adult", "adult", "old"]:
-            node_range = age_group_to_node_range[age_group]
-            if node_range[0] <= node_id <= node_range[1]:
-                return age_group
-        return None
+AGE_GROUP_LOOKUP = RangeLookup(age_group_to_node_range)
 
-    def get_profession_group(self, node_id: int) -> str | None:
+def get_age_group(node_id)->str|None:
+    return AGE_GROUP_LOOKUP.group(node_id)
 
-        """
-        Returns the profession group string for a given node_id.
-        Returns None if the node_id does not fall into any defined profession group range.
-        """
-        for profession_group, node_range in profession_group_to_node_range.items():
-            if node_range[0] <= node_id <= node_range[1]:
-                return profession_group
-        return None
+def get_age_group_codes(node_ids) -> np.ndarray:
+    """
+    Returns the age group code of every node id, AGE_GROUP_LOOKUP.names[code] is the age group.
+    """
+    return AGE_GROUP_LOOKUP.codes(node_ids)
 
+PROFESSION_GROUP_LOOKUP = RangeLookup(profession_group_to_node_range, num_nodes=DEFAULT_POPULATION)
 
-def generate_network():
+# 2. Function to get profession group from a node_id
+def get_profession_group(node_id: int) -> str | None:
 
-    # node IDs are in [0,100k)
+    """
+    Returns the profession group string for a given node_id.
+    Returns None if the node_id does not fall into any defined profession group range.
+    """
+    return PROFESSION_GROUP_LOOKUP.group(node_id)
 
-    nodes = [{}]*100_000
+def get_profession_group_codes(node_ids) -> np.ndarray:
+    """
+    Returns the profession group code of every node id, PROFESSION_GROUP_LOOKUP.names[code] is the profession group.
+    Node ids without a profession get RangeLookup.NO_GROUP.
+    """
+    return PROFESSION_GROUP_LOOKUP.codes(node_ids)
 
-    print("Generating families")
-    families, family_index = generate_families(age_group_to_node_range)
-    print("Generated families")
 
-    for node,fam_index in family_index.items():
-        nodes[node]["family_ids"] = fam_index
+class Network:
+    """
+    Columnar representation of the population.
 
+    family_id[i] / comm_id[i] / side_comm_id[i] give the family / work community / side community of node i
+    (-1 if none), node_friend_groups[i] gives the friend group ids of node i.
+    families, friend_groups, communities and side_communities hold the members of every group
+    (see GroupMembership), they can be iterated and indexed like the lists of lists they replace.
+    A node is in at most one work community and at most one side community.
+    """
 
-    print("Generating friend groups of kids")
-    kids_friend_groups, kid_friend_group_index = generate_friend_groups(age_group_to_node_range["kid"])
-    print("Generated friend groups of kids")
+    def __init__(self, num_nodes: int, families: GroupMembership, friend_groups: GroupMembership,
+                 communities: GroupMembership,
+                 age_ranges: dict[str, tuple[int, int]] | None = None,
+                 profession_ranges: dict[str, tuple[int, int]] | None = None,
+                 side_communities: GroupMembership | None = None):
+        self.num_nodes: int = num_nodes
+        self.age_group_to_node_range = age_ranges or age_group_to_node_range
+        self.profession_group_to_node_range = profession_ranges or profession_group_to_node_range
+        self.age_group_lookup = RangeLookup(self.age_group_to_node_range, num_nodes)
+        self.profession_group_lookup = RangeLookup(self.profession_group_to_node_range, num_nodes)
+        self.families: GroupMembership = families
+        self.friend_groups: GroupMembership = friend_groups
+        self.communities: GroupMembership = communities
+        self.side_communities: GroupMembership = (side_communities if side_communities is not None
+                                                        else GroupMembership.empty())
+
+        self.family_id: np.ndarray = families.labels(num_nodes)
+        self.comm_id: np.ndarray = communities.labels(num_nodes)
+        self.side_comm_id: np.ndarray = self.side_communities.labels(num_nodes)
+        self.node_friend_groups: GroupMembership = friend_groups.transpose(num_nodes)
+
+    def __setstate__(self, state):
+        if "nodes" in state:
+            # pickles from before the columnar representation stored lists of lists
+            state = Network(len(state["nodes"]),
+                            GroupMembership.from_groups(state["families"]),
+                            GroupMembership.from_groups(state["friend_groups"]),
+                            GroupMembership.from_groups(state["communities"])).__dict__
+        self.__dict__.update(state)
+        if "side_communities" not in state:
+            # networks from before side communities
+            self.side_communities = GroupMembership.empty()
+            self.side_comm_id = np.full(self.num_nodes, -1, dtype=np.int32)
+
+    def save(self, path):
+        """
+        Writes the network as an array directory (see graph_arrays.save_arrays).
+        """
+        arrays = {"family_id": self.family_id, "comm_id": self.comm_id, "side_comm_id": self.side_comm_id,
+                  "age_group_codes": self.age_group_lookup.table,
+                  "profession_group_codes": self.profession_group_lookup.table}
+        for name in ("families", "friend_groups", "communities", "side_communities", "node_friend_groups"):
+            membership = getattr(self, name)
+            arrays[f"{name}_indptr"] = membership.indptr
+            arrays[f"{name}_indices"] = membership.indices
+        save_arrays(path, "network", arrays, {
+            "num_nodes": self.num_nodes,
+            "age_group_to_node_range": self.age_group_to_node_range,
+            "profession_group_to_node_range": self.profession_group_to_node_range,
+        })
+
+    @classmethod
+    def load(cls, path, mmap=True) -> "Network":
+        """
+        Loads a network written by save, with mmap=True the arrays are memory-mapped instead of read.
+        """
+        arrays, attrs = load_arrays(path, "network", mmap)
+        network = cls.__new__(cls)
+        network.num_nodes = attrs["num_nodes"]
+        network.age_group_to_node_range = {k: tuple(v) for k, v in attrs["age_group_to_node_range"].items()}
+        network.profession_group_to_node_range = {k: tuple(v) for k, v in attrs["profession_group_to_node_range"].items()}
+        network.age_group_lookup = RangeLookup(network.age_group_to_node_range, table=arrays["age_group_codes"])
+        network.profession_group_lookup = RangeLookup(network.profession_group_to_node_range,
+                                                      table=arrays["profession_group_codes"])
+        for name in ("families", "friend_groups", "communities", "node_friend_groups"):
+            setattr(network, name, GroupMembership(arrays[f"{name}_indptr"], arrays[f"{name}_indices"]))
+        network.family_id = arrays["family_id"]
+        network.comm_id = arrays["comm_id"]
+        if "side_comm_id" in arrays:
+            network.side_communities = GroupMembership(arrays["side_communities_indptr"],
+                                                       arrays["side_communities_indices"])
+            network.side_comm_id = arrays["side_comm_id"]
+        else:
+            # saved before side communities
+            network.side_communities = GroupMembership.empty()
+            network.side_comm_id = np.full(network.num_nodes, -1, dtype=np.int32)
+        return network
+
+    def get_family_id(self, node_id: int) -> int | None:
+        family_id = int(self.family_id[node_id])
+        return family_id if family_id >= 0 else None
+
+    def get_comm_id(self, node_id: int) -> int | None:
+        comm_id = int(self.comm_id[node_id])
+        return comm_id if comm_id >= 0 else None
+
+    def get_friend_group_ids(self, node_id: int) -> list[int]:
+        return self.node_friend_groups[node_id].tolist()
+
+    def get_node(self, node_id: int) -> dict:
+        """
+        Returns the attributes of a node in the dict layout nodes used to have, keys of absent attributes are left out.
+        """
+        node = {}
+        if self.family_id[node_id] >= 0:
+            node["family_ids"] = int(self.family_id[node_id])
+        friend_group_ids = self.get_friend_group_ids(node_id)
+        if friend_group_ids:
+            node["friend_group_ids"] = friend_group_ids
+        if self.comm_id[node_id] >= 0:
+            node["comm_id"] = int(self.comm_id[node_id])
+        if self.side_comm_id[node_id] >= 0:
+            node["side_comm_id"] = int(self.side_comm_id[node_id])
+        return node
+
+    @property
+    def nodes(self) -> list[dict]:
+        """
+        Materializes every node with get_node, only meant for small populations and old callers.
+        """
+        return [self.get_node(node_id) for node_id in range(self.num_nodes)]
 
-    for node_id, kfg_indexes in kid_friend_group_index.items():
-        nodes[node_id]["friend_group_ids"] = kfg_indexes
+    @property
+    def nbytes(self) -> int:
+        return (self.family_id.nbytes + self.comm_id.nbytes + self.side_comm_id.nbytes
+                + self.node_friend_groups.nbytes + self.families.nbytes + self.friend_groups.nbytes
+                + self.communities.nbytes + self.side_communities.nbytes)
 
-    print("Generating friend groups of young_adults")
-    young_adults_friend_groups, young_adults_friend_group_index = generate_friend_groups(age_group_to_node_range["young_adult"])
-    print("Generating friend groups of young_adults")
+    @property
+    def layers(self) -> dict[str, GroupMembership]:
+        """
+        groups of every edge type, group_edges.iter_group_edges expands them into edges.
+        Side communities give work edges too.
+        """
+        work = self.communities
+        if len(self.side_communities):
+            work = work.concatenate(self.side_communities)
+        return {"family": self.families, "friend": self.friend_groups, "work": work}
 
-    # merging friend groups lists into one
-    friend_groups = kids_friend_groups + young_adults_friend_groups
+    def get_age_group(self, node_id) -> str | None:
+        return self.age_group_lookup.group(node_id)
 
-    for node_id, yafg_indexes in young_adults_friend_group_index.items():
-        # yafg_ids are re-indexed for the new merged list
-        nodes[node_id]["friend_group_ids"] = [yafg_id + len(kids_friend_groups) for yafg_id in yafg_indexes]
+    def get_profession_group(self, node_id: int) -> str | None:
 
+        """
+        Returns the profession group string for a given node_id.
+        Returns None if the node_id does not fall into any defined profession group range.
+        """
+        return self.profession_group_lookup.group(node_id)
 
-    print("Generating profession A communities")
-    profA_communitites, profA_comm_index = generate_work_communities(profession_group_to_node_range["A"], 15, 30)
-    print("Generated profession A communities")
+    def get_age_group_codes(self, node_ids=None) -> np.ndarray:
+        """
+        Returns the age group code of the given node ids (of every node if node_ids is None).
+        """
+        if node_ids is None:
+            return self.age_group_lookup.table
+        return self.age_group_lookup.codes(node_ids)
 
-    for node_id, comm_index in profA_comm_index.items():
-        nodes[node_id]["comm_id"] = comm_index
+    def get_profession_group_codes(self, node_ids=None) -> np.ndarray:
+        """
+        Returns the profession group code of the given node ids (of every node if node_ids is None).
+        """
+        if node_ids is None:
+            return self.profession_group_lookup.table
+        return self.profession_group_lookup.codes(node_ids)
 
-    print("Generating profession B communities")
-    profB_communitites, profB_comm_index = generate_work_communities(profession_group_to_node_range["B"], 10, 20)
-    print("Generated profession B communities")
 
-    communities = profA_communitites + profB_communitites
+def _generate_layer(layer: str, node_range: tuple[int, int], params: tuple,
+                    task_seed: np.random.SeedSequence) -> GroupMembership | tuple[GroupMembership, GroupMembership]:
+    """
+    Generates one independent layer of the network, run either in-process or in a worker process.
+    A work layer gives (communities, side_communities), see generate_profession_communities.
+    Every layer draws from its own stream spawned from the network's SeedSequence,
+    so the layer doesn't depend on where it ran.
+    """
+    rng = np.random.default_rng(task_seed)
+    if layer == "work":
+        profession_ranges, community_sizes, side_options = params
+        return generate_profession_communities(profession_ranges, community_sizes, rng=rng, **side_options)
+    groups, _ = generate_friend_groups(node_range, mode=params[0], rng=rng)
+    return GroupMembership.from_groups(groups)
+
+
+def generate_network(population: int = DEFAULT_POPULATION,
+                     age_shares: dict[str, float] | None = None,
+                     profession_shares: dict[str, float] | None = None,
+                     family_size: int = 10,
+                     friend_group_mode: str = "incremental",
+                     workers: int = 1,
+                     seed: int | np.random.SeedSequence | np.random.Generator | None = None,
+                     side_sizes: tuple[int, int] | None = None,
+                     side_share: float = 1.0):
+    """
+    Generates the population network.
+
+    - population is the number of nodes, node IDs are in [0, population)
+    - age_shares / profession_shares override default_age_shares / default_profession_shares
+    - family_size is the number of people per family (see generate_families)
+    - friend_group_mode is passed on to generate_friend_groups, "vectorized" is the fastest for large populations
+    - workers > 1 generates the friend group and work community layers in a pool of that many processes
+    - seed (an int, SeedSequence or Generator, see seed_sequence_from) makes the result bit-reproducible,
+      every layer gets its own child stream spawned from it, so the same seed gives the same network for any
+      number of workers
+    - side_sizes (min_size, max_size) gives a side_share of every profession group with work communities
+      side communities as well (see partition_side_communities), stored apart in side_communities
+
+    The friend group family constraint (get_family_member) pairs the ids x and x ^ 1, which are siblings only as
+    long as the kid and young_adult ranges start at even ids and have 2 people per family, as with the defaults.
+    """
 
-    for node_id, comm_index in profB_comm_index.items():
-        nodes[node_id]["comm_id"] = comm_index + len(profA_communitites)
+    age_ranges, profession_ranges = compute_node_ranges(population, age_shares, profession_shares)
+
+    # independent layers, merged in this order
+    layers = [("friend", age_ranges["kid"], (friend_group_mode,)),
+              ("friend", age_ranges["young_adult"], (friend_group_mode,))]
+    # all profession groups in one vectorized layer, only the groups in profession_community_sizes get communities
+    layers.append(("work", age_ranges["adult"], (profession_ranges, profession_community_sizes,
+                                                 {"side_sizes": side_sizes, "side_share": side_share})))
+
+    seed_sequence = seed_sequence_from(seed)
+    task_seeds = seed_sequence.spawn(len(layers))
+
+    if workers > 1:
+        print(f"Generating {len(layers)} friend group and community layers with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_generate_layer, *layer, task_seed)
+                       for layer, task_seed in zip(layers, task_seeds)]
+
+            print("Generating families")
+            families, family_index = generate_families(age_ranges, family_size)
+            print("Generated families")
+
+            layer_groups = [future.result() for future in futures]
+        print("Generated friend group and community layers")
+    else:
+        print("Generating families")
+        families, family_index = generate_families(age_ranges, family_size)
+        print("Generated families")
+
+        layer_groups = []
+        for (layer, node_range, params), task_seed in zip(layers, task_seeds):
+            print(f"Generating {layer} layer for nodes {node_range}")
+            layer_groups.append(_generate_layer(layer, node_range, params, task_seed))
+            print(f"Generated {layer} layer for nodes {node_range}")
+
+    # merging the layers, group ids of every layer are shifted by the number of groups before them
+    # (young adult friend groups by len(kids_friend_groups))
+    friend_groups = GroupMembership.empty()
+    communities = GroupMembership.empty()
+    side_communities = GroupMembership.empty()
+    for (layer, _, _), groups in zip(layers, layer_groups):
+        if layer == "friend":
+            friend_groups = friend_groups.concatenate(groups)
+        else:
+            communities = communities.concatenate(groups[0])
+            side_communities = side_communities.concatenate(groups[1])
+
+    return Network(population, families, friend_groups, communities, age_ranges, profession_ranges,
+                   side_communities)
+
+def load_or_generate_network(cache: ArtifactCache, seed, workers=1, **params) -> Network:
+    """
+    generate_network through an ArtifactCache: the network built from the same parameters, seed and code version
+    is loaded (memory-mapped) instead of generated again. params are the keyword arguments of generate_network.
+    """
+    def build(seed, **build_params):
+        return generate_network(**build_params, seed=seed, workers=workers)
 
-    return Network(nodes, families, friend_groups, communities)
+    code_version = source_version(sys.modules[__name__], family_generation, friend_group_generation,
+                                  community_generation, group_membership, group_lookup, random_streams,
+                                  graph_arrays)
+    return cache.get_or_build("network", params, seed, code_version, build,
+                              lambda path, network: network.save(path), Network.load)
 
 if __name__ == "__main__":
     network = generate_network()
 
-    with open("network.bin", "wb") as file:
-        pickle.dump(network,file)
\ No newline at end of file
+    network.save("network")
\ No newline at end of file
@@ -0,0 +1,24 @@
+import random
+
+import numpy as np
+
+
+def seed_sequence_from(seed):
+    """
+    Turn an int, SeedSequence, Generator or None into a SeedSequence that child streams can be spawned from.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2 ** 63)))
+    return np.random.SeedSequence(seed)
+
+
+def python_random(rng=None) -> random.Random:
+    """
+    Returns a random.Random seeded from rng (a numpy Generator, SeedSequence, int seed or None for fresh entropy).
+
+    Generators that draw one number at a time are much faster with random.Random than with a numpy Generator,
+    seeding it from the Generator keeps them on the same reproducible stream.
+    """
+    return random.Random(int(np.random.default_rng(rng).integers(2 ** 63)))
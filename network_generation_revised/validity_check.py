@@ -1,11 +1,15 @@
 import os
-import pickle
-import csv
-import shutil
+import sys
 
-from network import Network
-with open("network.bin", "rb") as file:
-    G:Network = pickle.load(file)
+import numpy as np
+
+from friend_group_generation import DISTRIBUTION_TARGETS
+from group_edges import iter_group_edges
+from network import Network, profession_community_sizes
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from formatting import write_edge_list
+from graph_arrays import EDGE_TYPE_CODES
 
 colors = {
 
@@ -18,142 +22,161 @@ colors = {
 
 }
 
-all_edges = set()
+# rules of generate_network checked by validate
+MAX_FRIEND_GROUP_SIZE = 5
+FRIEND_AGE_GROUPS = ("kid", "young_adult")
+DISTRIBUTION_TOLERANCE = 0.01
+# violations listed per rule in a report
+MAX_EXAMPLES = 5
+
 
-for family in G.families:
-    for i in family:
-        for j in family:
-            all_edges.add((i,j,"family"))
+def _result(violations: int, examples, message: str) -> dict:
+    return {"passed": violations == 0, "violations": int(violations), "examples": list(examples)[:MAX_EXAMPLES],
+            "message": message}
 
-for friend_group in G.friend_groups:
-    for i in friend_group:
-        for j in friend_group:
-            all_edges.add((i,j,"friend"))
 
-for community in G.communities:
-    for i in community:
-        for j in community:
-            all_edges.add((i,j,"work"))
+def check_friend_group_sizes(network: Network, max_group_size=MAX_FRIEND_GROUP_SIZE) -> dict:
+    """
+    friend groups must have at most max_group_size members, examples are (group id, size)
+    """
+    sizes = network.friend_groups.sizes()
+    too_large = np.flatnonzero(sizes > max_group_size)
+    return _result(len(too_large), zip(too_large.tolist(), sizes[too_large].tolist()),
+                   f"{len(too_large)} of {len(sizes)} friend groups have more than {max_group_size} members")
 
 
-def remove_empty_rows_from_csv(input_filepath: str, output_filepath: str = None,
-                               has_header: bool = True, delimiter: str = ',',
-                               quotechar: str = '"') -> bool:
+def check_membership_distribution(network: Network, age_groups=FRIEND_AGE_GROUPS,
+                                  tolerance=DISTRIBUTION_TOLERANCE) -> dict:
+    """
+    The people of every age group in age_groups must be in 1 to max(DISTRIBUTION_TARGETS) friend groups,
+    with the fraction of people in k groups within tolerance of DISTRIBUTION_TARGETS[k].
+    Every deviating (age group, k) is a violation, examples are (age group, k, fraction, target).
+    """
+    memberships = network.node_friend_groups.sizes()
+    max_count = max(DISTRIBUTION_TARGETS)
+    targets = np.array([DISTRIBUTION_TARGETS.get(k, 0.0) for k in range(max_count + 1)])
+    examples = []
+    for age_group in age_groups:
+        start, end = network.age_group_to_node_range[age_group]
+        counts = memberships[start:end + 1]
+        if not len(counts):
+            continue
+        histogram = np.bincount(np.minimum(counts, max_count + 1), minlength=max_count + 2)
+        fractions = histogram / len(counts)
+        expected = np.append(targets, 0.0)
+        for k in np.flatnonzero(np.abs(fractions - expected) > tolerance).tolist():
+            # k == max_count + 1 stands for more than max_count groups
+            label = k if k <= max_count else f">{max_count}"
+            examples.append((age_group, label, round(float(fractions[k]), 4), float(expected[k])))
+    return _result(len(examples), examples,
+                   f"{len(examples)} friend group counts deviate more than {tolerance} from DISTRIBUTION_TARGETS")
+
+
+def check_family_friend_groups(network: Network) -> dict:
+    """
+    No friend group may hold a person and their family member (get_family_member, id ^ 1),
+    examples are (group id, person, family member).
+    """
+    groups = network.friend_groups
+    group_ids = groups.group_ids().astype(np.int64)
+    members = groups.indices.astype(np.int64)
+    keys = np.sort(group_ids * network.num_nodes + members)
+    family_keys = group_ids * network.num_nodes + (members ^ 1)
+    position = np.minimum(np.searchsorted(keys, family_keys), max(len(keys) - 1, 0))
+    # every pair shows up from both of its members, only keep it from the even one
+    clash = np.flatnonzero((keys[position] == family_keys) & (members % 2 == 0)) if len(keys) else position
+    violating_groups = np.unique(group_ids[clash])
+    examples = zip(group_ids[clash].tolist(), members[clash].tolist(), (members[clash] ^ 1).tolist())
+    return _result(len(violating_groups), examples,
+                   f"{len(violating_groups)} friend groups hold {len(clash)} family pairs")
+
+
+def check_community_sizes(network: Network, community_sizes=None, communities=None) -> dict:
+    """
+    Every node is in at most one work community, all members of a community are in the same profession group
+    and the community has (min_size, max_size) of that group (community_sizes, profession_community_sizes
+    by default) members. Examples are (community id, profession group, size, problem).
+    communities defaults to network.communities, check_side_community_sizes passes the side communities.
+    """
+    community_sizes = profession_community_sizes if community_sizes is None else community_sizes
+    communities = network.communities if communities is None else communities
+    lookup = network.profession_group_lookup
+    sizes = communities.sizes()
+    group_ids = communities.group_ids()
+
+    codes = lookup.codes(communities.indices)
+    first_codes = np.full(len(communities), lookup.NO_GROUP, dtype=np.uint8)
+    first_codes[sizes > 0] = codes[communities.indptr[:-1][sizes > 0]]
+    mixed = np.bincount(group_ids, weights=codes != first_codes[group_ids], minlength=len(communities)) > 0
+
+    # [min_size, max_size] by profession code, groups without communities get the empty range [1, 0]
+    min_sizes = np.ones(lookup.NO_GROUP + 1, dtype=np.int64)
+    max_sizes = np.zeros(lookup.NO_GROUP + 1, dtype=np.int64)
+    for code, name in enumerate(lookup.names):
+        if name in community_sizes:
+            min_sizes[code], max_sizes[code] = community_sizes[name]
+    out_of_bounds = (sizes < min_sizes[first_codes]) | (sizes > max_sizes[first_codes])
+
+    memberships = np.bincount(communities.indices, minlength=network.num_nodes)
+    overlapping = np.flatnonzero(memberships > 1)
+
+    bad = np.flatnonzero(mixed | out_of_bounds)
+    names = [*lookup.names, *[None] * (lookup.NO_GROUP + 1 - len(lookup.names))]
+    examples = [(community_id, names[first_codes[community_id]], int(sizes[community_id]),
+                 "mixed profession groups" if mixed[community_id] else "size out of bounds")
+                for community_id in bad[:MAX_EXAMPLES].tolist()]
+    examples += [(None, None, None, f"node {node_id} in {memberships[node_id]} communities")
+                 for node_id in overlapping[:MAX_EXAMPLES].tolist()]
+    return _result(len(bad) + len(overlapping), examples,
+                   f"{np.count_nonzero(out_of_bounds)} communities out of bounds, {np.count_nonzero(mixed)} mixing "
+                   f"profession groups, {len(overlapping)} nodes in several communities")
+
+
+def check_side_community_sizes(network: Network, side_sizes=None, community_sizes=None) -> dict:
     """
-    Removes empty rows from a CSV file.
-    An empty row is defined as a row where all cells are either empty strings
-    or contain only whitespace.
-
-    Args:
-        input_filepath (str): Path to the input CSV file.
-        output_filepath (str, optional): Path to save the cleaned CSV file.
-            If None, the input file will be modified in-place (safely via a temp file).
-            Defaults to None.
-        has_header (bool): Whether the CSV file has a header row.
-            If True, the header is preserved. Defaults to True.
-        delimiter (str): The delimiter used in the CSV file. Defaults to ','.
-        quotechar (str): The quote character used in the CSV file. Defaults to '"'.
-
-    Returns:
-        bool: True if the operation was successful, False otherwise.
+    The rules of check_community_sizes for the side communities: at most one per node, within one profession
+    group with work communities and of side_sizes (min_size, max_size) members, any size if side_sizes is None.
     """
-    if not os.path.exists(input_filepath):
-        print(f"Error: Input file '{input_filepath}' not found.")
-        return False
-
-    is_in_place_modification = output_filepath is None or \
-                               os.path.abspath(input_filepath) == os.path.abspath(output_filepath)
-
-    temp_filepath = ""
-    effective_output_path = ""
-
-    if is_in_place_modification:
-        # Create a temporary file name in the same directory as the input file
-        input_dir = os.path.dirname(input_filepath)
-        base_name = os.path.basename(input_filepath)
-        name, ext = os.path.splitext(base_name)
-        # Ensure temp_filepath is unique enough or handle potential collisions
-        temp_filepath = os.path.join(input_dir, f"{name}_csv_clean_temp{ext}")
-        effective_output_path = temp_filepath
-    else:
-        effective_output_path = output_filepath
-        # Create output directory if it doesn't exist
-        output_dir = os.path.dirname(effective_output_path)
-        if output_dir and not os.path.exists(output_dir):
-            try:
-                os.makedirs(output_dir)
-            except OSError as e:
-                print(f"Error creating directory '{output_dir}': {e}")
-                return False
-
-    rows_written = 0
-    empty_rows_skipped = 0
-
-    try:
-        with open(input_filepath, 'r', newline='', encoding='utf-8-sig') as infile, \
-                open(effective_output_path, 'w', newline='', encoding='utf-8') as outfile:
-
-            reader = csv.reader(infile, delimiter=delimiter, quotechar=quotechar)
-            writer = csv.writer(outfile, delimiter=delimiter, quotechar=quotechar)
-            if has_header:
-                try:
-                    header = next(reader)
-                    writer.writerow(header)
-                    rows_written += 1
-                except StopIteration:
-                    # File is empty or effectively empty
-                    print(f"Warning: File '{input_filepath}' is empty or no header found.")
-                    # If in-place, ensure the original (empty) file is preserved or an empty temp is removed
-                    if is_in_place_modification and os.path.exists(temp_filepath):
-                        os.remove(temp_filepath)
-                    return True  # Successful in the sense that an empty output is correct for empty input
-
-            for row in reader:
-                # Check if all cells in the row are empty or contain only whitespace
-                is_empty = True
-                if not row:  # Handle completely blank lines that csv.reader might return as []
-                    is_empty = True
-                else:
-                    for cell in row:
-                        if cell is not None and cell.strip() != "":
-                            is_empty = False
-                            break
-
-                if is_empty:
-                    empty_rows_skipped += 1
-                else:
-                    writer.writerow(row)
-                    rows_written += 1
-
-        if is_in_place_modification:
-            # If any rows were written to the temp file, replace original.
-            # If no rows were written (e.g. only header and then empty rows),
-            # the temp file might be just a header or empty.
-            if rows_written > 0 or (has_header and rows_written == 1 and empty_rows_skipped > 0):
-                shutil.move(temp_filepath, input_filepath)
-            elif os.path.exists(temp_filepath):  # Temp file was created but is effectively empty or same as input
-                os.remove(temp_filepath)
-
-        print(f"Successfully processed '{input_filepath}'.")
-        print(f"  Rows written: {rows_written}")
-        print(f"  Empty rows skipped: {empty_rows_skipped}")
-        if not is_in_place_modification:
-            print(f"  Cleaned data saved to '{output_filepath}'.")
-        else:
-            print(f"  File '{input_filepath}' modified in-place.")
-        return True
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        # Clean up temporary file if it exists and an error occurred
-        if is_in_place_modification and os.path.exists(temp_filepath):
-            try:
-                os.remove(temp_filepath)
-                print(f"Temporary file '{temp_filepath}' removed due to error.")
-            except OSError as e_del:
-                print(f"Error removing temporary file '{temp_filepath}': {e_del}")
-        return False
-
-remove_empty_rows_from_csv("edges.csv","clean_edges.csv",has_header=False, delimiter=";")
+    community_sizes = profession_community_sizes if community_sizes is None else community_sizes
+    bounds = side_sizes if side_sizes is not None else (1, network.num_nodes)
+    return check_community_sizes(network, {name: bounds for name in community_sizes}, network.side_communities)
+
+
+def validate(network: Network, community_sizes=None, side_sizes=None) -> dict[str, dict]:
+    """
+    Checks the rules generate_network follows, with array operations over the CSR memberships.
+    Side communities, if the network has any, are checked against side_sizes.
+
+    returns rule name -> {"passed", "violations" (count), "examples" (at most MAX_EXAMPLES), "message"}
+    """
+    report = {
+        "friend_group_sizes": check_friend_group_sizes(network),
+        "membership_distribution": check_membership_distribution(network),
+        "family_friend_groups": check_family_friend_groups(network),
+        "community_sizes": check_community_sizes(network, community_sizes),
+    }
+    if len(network.side_communities):
+        report["side_community_sizes"] = check_side_community_sizes(network, side_sizes, community_sizes)
+    return report
+
+
+def print_report(report: dict[str, dict]):
+    for rule, result in report.items():
+        print(f"{'OK  ' if result['passed'] else 'FAIL'} {rule}: {result['message']}")
+        for example in result["examples"]:
+            print(f"       {example}")
+
+
+if __name__ == "__main__":
+    G: Network = Network.load("network")
+
+    report = validate(G)
+    print_report(report)
 
+    edge_counts = write_edge_list("edges.csv", iter_group_edges(G.layers, G.num_nodes))
+    print(f"{edge_counts.sum()} edges written to edges.csv")
+    for edge_type in G.layers:
+        print(f"  {edge_type}: {edge_counts[EDGE_TYPE_CODES[edge_type]]}")
 
+    if not all(result["passed"] for result in report.values()):
+        sys.exit(1)
@@ -1,9 +1,15 @@
-import pickle
+import os
+import sys
 
 import networkx as nx
 from fa2_modified import ForceAtlas2
 import time
 from PIL import Image, ImageDraw
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "network_generation"))
+from graph_arrays import load_graph
+
+
 def run_forceatlas2_with_progress(
     G: nx.Graph,
     iterations: int = 1000,
@@ -167,12 +173,7 @@ def draw_graph_image(
 
 if __name__ == "__main__":
 
-    with open("../network_generation/rs_graph.gpickle", "rb") as file:
-        G = pickle.load(file)
-
-    for u, v, data in list(G.edges(data=True)):
-        if data.get('type') != 'family':
-            G.remove_edge(u, v)
+    G = load_graph("../network_generation/rs_graph").to_networkx(edge_types=("family",))
 
 
     # Parameters